@@ -0,0 +1,55 @@
+# alerts.py
+from threading import Thread
+import logging
+import queue
+import time
+
+logger = logging.getLogger('postpartum.alerts')
+
+
+# Background evaluation of newly written check-ins and screenings. Write routes
+# enqueue an event after their commit and return at once; one worker thread
+# collects events for `window` seconds (up to max_batch), runs evaluate(events),
+# which looks only at the new rows, and passes each new alert to notify(alert).
+# Batching keeps the worker to a few reads and one write per window instead of
+# several per request, so it competes less with requests for the database.
+class AlertWorker:
+    def __init__(self, evaluate, notify, max_pending=10000, window=0.05, max_batch=1000):
+        self.evaluate = evaluate
+        self.notify = notify
+        self.window = window
+        self.max_batch = max_batch
+        self.dropped = 0
+        self._queue = queue.Queue(max_pending)
+        self._thread = Thread(target=self._run, name='alert-worker', daemon=True)
+        self._thread.start()
+
+    # Never blocks the request; a full queue drops the event and logs it
+    def enqueue(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            logger.error('Alert queue full, dropped evaluation of %r', event)
+
+    # Wait until every queued event has been evaluated
+    def join(self):
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            events = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(events) < self.max_batch:
+                try:
+                    events.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                for alert in self.evaluate(events):
+                    self.notify(alert)
+            except Exception:
+                logger.exception('Alert evaluation failed for %d events', len(events))
+            finally:
+                for _ in events:
+                    self._queue.task_done()
@@ -0,0 +1,129 @@
+# api_client.py
+from collections import OrderedDict
+import os
+import time
+from threading import Lock
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_URL = os.environ.get("POSTPARTUM_API_URL", "http://localhost:5000")
+CACHE_TTL_SECONDS = 60
+CACHE_MAX_ENTRIES = 1000
+# Older buckets only change through back-dated /sync records, picked up by a full reload this often
+CACHE_FULL_RELOAD_SECONDS = 15 * 60
+HTTP_DATE_FORMAT = "%a, %d %b %Y %H:%M:%S GMT"
+
+# /trends metrics shown on the trend charts, with their chart labels
+TREND_COLUMNS = {
+    "mental_health": "Mental Health Score",
+    "stress_level": "Stress Score",
+    "social_support": "Social Support Score",
+    "physical_health": "Physical Health Score",
+    "nutrition": "Nutrition Score",
+    "sleep_quality": "Sleep Score",
+    "epds_score": "EPDS Score",
+}
+
+
+# One pooled HTTP session per process, with retries on transient failures
+def make_session(pool_size=10):
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.2, status_forcelist=(502, 503, 504), allowed_methods=("GET",))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Rows (or, for /summary, the JSON body) already fetched for one user and resource
+class CachedResource:
+    def __init__(self):
+        self.frame = pd.DataFrame()
+        self.data = None
+        self.fetched_at = 0.0
+        self.loaded_at = 0.0
+        self.lock = Lock()
+
+
+# Fetches /trends per user and keeps the series cached. Within the TTL the cached
+# DataFrame is returned as is; after it, only the last cached bucket and newer
+# ones are requested, with a full reload every CACHE_FULL_RELOAD_SECONDS. One
+# client is shared by every session, so at most `max_entries` series are kept,
+# least recently used first out.
+class ApiDataClient:
+    def __init__(self, base_url=API_URL, ttl=CACHE_TTL_SECONDS, session=None, max_entries=CACHE_MAX_ENTRIES):
+        self.base_url = base_url.rstrip("/")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.session = session or make_session()
+        self._cache = OrderedDict()
+        self._cache_lock = Lock()
+
+    def _resource(self, token, path):
+        with self._cache_lock:
+            resource = self._cache.get((token, path))
+            if resource is None:
+                resource = self._cache[(token, path)] = CachedResource()
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+            self._cache.move_to_end((token, path))
+            return resource
+
+    # Mean per day, week or month from /trends, labelled like the Trends charts.
+    # The server aggregates, so only one point per bucket crosses the network.
+    def trends(self, token, resolution="day", user_id=None):
+        path = "/trends" if user_id is None else f"/trends/{user_id}"
+        resource = self._resource(token, f"{path}?resolution={resolution}")
+        with resource.lock:
+            if time.monotonic() - resource.fetched_at >= self.ttl:
+                params = {"resolution": resolution, "metrics": ",".join(TREND_COLUMNS)}
+                last = None
+                if not resource.frame.empty and time.monotonic() - resource.loaded_at < CACHE_FULL_RELOAD_SECONDS:
+                    last = resource.frame["Date"].iloc[-1]
+                if last is not None:
+                    params["from"] = last.date().isoformat()
+                response = self.session.get(f"{self.base_url}{path}", params=params,
+                                            headers={"Authorization": token}, timeout=10)
+                response.raise_for_status()
+                new = trend_frame(response.json()["series"])
+                if last is None:
+                    resource.frame = new
+                    resource.loaded_at = time.monotonic()
+                elif not new.empty:
+                    # The last cached bucket may have still been filling, so it is replaced
+                    resource.frame = append_buckets(resource.frame[resource.frame["Date"] < last], new)
+                resource.fetched_at = time.monotonic()
+            return resource.frame
+
+    # Rolling metrics from /summary/<user_id>, refetched once the TTL has passed
+    def summary(self, token, user_id):
+        resource = self._resource(token, f"/summary/{user_id}")
+        with resource.lock:
+            if time.monotonic() - resource.fetched_at >= self.ttl:
+                response = self.session.get(f"{self.base_url}/summary/{user_id}",
+                                            headers={"Authorization": token}, timeout=10)
+                response.raise_for_status()
+                resource.data = response.json()
+                resource.fetched_at = time.monotonic()
+            return resource.data
+
+
+def trend_frame(series):
+    columns = []
+    for metric, label in TREND_COLUMNS.items():
+        points = series.get(metric)
+        if points:
+            dates = pd.to_datetime([point["date"] for point in points], format=HTTP_DATE_FORMAT)
+            columns.append(pd.Series([point["mean"] for point in points], index=dates, name=label))
+    if not columns:
+        return pd.DataFrame(columns=["Date", *TREND_COLUMNS.values()])
+    return pd.concat(columns, axis=1).sort_index().rename_axis("Date").reset_index()
+
+
+# `older` rows followed by `newer` ones, with the columns in chart order
+def append_buckets(older, newer):
+    frame = pd.concat([older, newer], ignore_index=True)
+    return frame[["Date", *(label for label in TREND_COLUMNS.values() if label in frame.columns)]]
@@ -1,17 +1,107 @@
 # app.py
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+from flask.globals import app_ctx
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import make_transient_to_detached
+from datetime import date, datetime, timedelta, timezone
+from functools import wraps
+import click
+import csv
+import heapq
+import io
+import itertools
+import json
 import jwt
 import os
+import time
+import zlib
+import numpy as np
+from risk_scoring import (FACTORS, EPDS_ALERT_THRESHOLD, EPDS_SELF_HARM_ITEM, MENTAL_HEALTH_SCORES,
+                          PHYSICAL_HEALTH_SCORES, RISK_BANDS, RISK_WEIGHTS_FILE, STRESS_SCORES,
+                          TOTAL_RISK_ALERT_THRESHOLD, daily_log_factor_matrix, epds_item_distribution,
+                          epds_item_scores, flag_self_harm, load_risk_model, pack_epds, raw_factor_scores,
+                          score_batch, score_packed_epds, weight_vector)
+from token_cache import TokenCache
+from response_cache import ResponseCache
+from serializers import RowSerializer, http_date, http_datetime
+from message_bus import MessageBus, PollingMessageBus
+from password_hashing import HashingBusy, PasswordHasher
+from group_commit import GroupCommitWriter, WriteQueueFull, configure_sqlite
+from metrics import Metrics, hashing_collector, instrument
+from alerts import AlertWorker
+from sharding import ShardRouter, create_shard_engine, existing_shards, move_rows
+from search import SearchIndex, match_expression, rank_matches
+import calibration
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///postpartum_health.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///postpartum_health.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key')
+# 'production' turns on WAL, tuned pragmas, a sized connection pool and the group-commit writer
+app.config['DATABASE_MODE'] = os.environ.get('DATABASE_MODE', 'default')
+app.config['GROUP_COMMIT_WINDOW'] = float(os.environ.get('GROUP_COMMIT_WINDOW', '0.002'))
+app.config['GROUP_COMMIT_MAX_BATCH'] = 256
+if app.config['DATABASE_MODE'] == 'production':
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 30,
+        'connect_args': {'timeout': 30, 'check_same_thread': False},
+    }
+app.config['MAX_PAGE_SIZE'] = 1000
+app.config['SEARCH_PAGE_SIZE'] = 20
+# Newest matches per index that /search ranks for one user
+app.config['SEARCH_MAX_MATCHES'] = 5000
+app.config['STREAM_CHUNK_SIZE'] = 500
+app.config['ANALYTICS_CHUNK_SIZE'] = 100000
+app.config['EXPORT_BATCH_SIZE'] = 5000
+app.config['TOKEN_CACHE_SIZE'] = 10000
+# Longest a cached token may go without rechecking its user's profile version, i.e. how long
+# a role or physician change made through another worker can take to reach this one
+app.config['TOKEN_REVALIDATE_SECONDS'] = float(os.environ.get('TOKEN_REVALIDATE_SECONDS', '5'))
+# Serialized /profile, /epds and /daily_log bodies kept for conditional GETs; larger bodies are streamed uncached
+app.config['RESPONSE_CACHE_MAX_BYTES'] = 64 * 1024 * 1024
+app.config['RESPONSE_CACHE_MAX_BODY'] = 1024 * 1024
+app.config['SYNC_MAX_RECORDS'] = 10000
+# 'memory' fans messages out within this process; 'poll' tails the message table so several worker processes can stream
+app.config['MESSAGE_BUS'] = os.environ.get('MESSAGE_BUS', 'memory')
+app.config['MESSAGE_STREAM_HEARTBEAT'] = 15
+app.config['ALERT_QUEUE_SIZE'] = 10000
+# Above 0, each patient's daily logs, screenings and summaries live in one of this many SQLite files next to the main database
+app.config['SHARD_COUNT'] = int(os.environ.get('SHARD_COUNT', '0'))
+app.config['SHARD_REBALANCE_BATCH_SIZE'] = 5000
+# Werkzeug method string for new hashes; scrypt with Werkzeug's default cost unless overridden
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 4 * app.config['PASSWORD_HASH_WORKERS']))
+# Requests slower than this are logged with their SQL; unset disables the slow-request log
+app.config['SLOW_REQUEST_SECONDS'] = float(os.environ['SLOW_REQUEST_SECONDS']) if os.environ.get('SLOW_REQUEST_SECONDS') else None
 
 db = SQLAlchemy(app)
+group_commit_writer = None
+if app.config['DATABASE_MODE'] == 'production':
+    with app.app_context():
+        configure_sqlite(db.engine)
+        group_commit_writer = GroupCommitWriter(db.engine, app.config['GROUP_COMMIT_WINDOW'],
+                                                app.config['GROUP_COMMIT_MAX_BATCH'])
+shard_router = None
+if app.config['SHARD_COUNT']:
+    with app.app_context():
+        shard_router = ShardRouter(db.engine.url, app.config['SHARD_COUNT'], app.config.get('SQLALCHEMY_ENGINE_OPTIONS'),
+                                   scopefunc=lambda: id(app_ctx._get_current_object()),
+                                   production=app.config['DATABASE_MODE'] == 'production',
+                                   group_commit_window=app.config['GROUP_COMMIT_WINDOW'],
+                                   group_commit_max_batch=app.config['GROUP_COMMIT_MAX_BATCH'])
+token_cache = TokenCache(app.config['TOKEN_CACHE_SIZE'])
+response_cache = ResponseCache(app.config['RESPONSE_CACHE_MAX_BYTES'], app.config['RESPONSE_CACHE_MAX_BODY'])
+password_hasher = PasswordHasher(app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_WORKERS'],
+                                 app.config['PASSWORD_HASH_MAX_PENDING'])
+metrics = Metrics()
+metrics.add_collector(hashing_collector(password_hasher.stats))
+with app.app_context():
+    instrument(app, [db.engine, *(shard_router.engines if shard_router else [])], metrics, app.config['SLOW_REQUEST_SECONDS'])
 
 # Models
 class User(db.Model):
@@ -22,8 +112,11 @@ class User(db.Model):
     is_physician = db.Column(db.Boolean, default=False)
     weeks_postpartum = db.Column(db.Integer)
     delivery_date = db.Column(db.DateTime)
+    # Physician who receives this patient's alerts
+    physician_id = db.Column(db.Integer, db.ForeignKey('user.id'))
 
 class DailyLog(db.Model):
+    __table_args__ = (db.Index('ix_daily_log_user_id_date', 'user_id', 'date'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
@@ -39,47 +132,692 @@ class DailyLog(db.Model):
     notes = db.Column(db.Text)
 
 class EPDSScore(db.Model):
+    __table_args__ = (db.Index('ix_epds_score_user_id_date', 'user_id', 'date'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
     score = db.Column(db.Integer, nullable=False)
+    # Per-item answer indices packed two bits each (see risk_scoring.pack_epds); NULL when only the total was sent
+    answers = db.Column(db.Integer)
 
 class Message(db.Model):
+    __table_args__ = (
+        db.Index('ix_message_sender_id_timestamp', 'sender_id', 'timestamp'),
+        db.Index('ix_message_receiver_id_timestamp', 'receiver_id', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     receiver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+# Per-patient aggregates maintained on insert so the physician view never rereads raw history
+SUMMARY_METRICS = ('sleep_hours', 'sleep_quality', 'stress_level')
+SUMMARY_WINDOWS = (7, 28)
+
+class PatientSummary(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    latest_epds_score = db.Column(db.Integer)
+    latest_epds_date = db.Column(db.Date)
+    last_log_date = db.Column(db.Date)
+
+# One row per patient per day; a rolling window is the sum of at most 28 of them
+class PatientDailySummary(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    log_count = db.Column(db.Integer, nullable=False, default=0)
+    sleep_hours_sum = db.Column(db.Float, nullable=False, default=0)
+    sleep_hours_count = db.Column(db.Integer, nullable=False, default=0)
+    sleep_quality_sum = db.Column(db.Float, nullable=False, default=0)
+    sleep_quality_count = db.Column(db.Integer, nullable=False, default=0)
+    stress_level_sum = db.Column(db.Float, nullable=False, default=0)
+    stress_level_count = db.Column(db.Integer, nullable=False, default=0)
+
+# Trend chart rollups: count, sum, min and max of one metric for one patient per
+# day, week (starting Monday) or month, updated with every inserted log or score
+DAILY_LOG_TREND_METRICS = ('mental_health', 'stress_level', 'social_support', 'physical_health', 'nutrition',
+                           'sleep_hours', 'sleep_quality', 'economic_stress')
+TREND_METRICS = DAILY_LOG_TREND_METRICS + ('epds_score',)
+TREND_RESOLUTIONS = ('day', 'week', 'month')
+
+class TrendRollup(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    resolution = db.Column(db.String(5), primary_key=True)
+    metric = db.Column(db.String(20), primary_key=True)
+    bucket = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0)
+    min_value = db.Column(db.Float)
+    max_value = db.Column(db.Float)
+
+# Threshold crossings found by the alert worker, at most one per patient, kind and day.
+# physician_id is the patient's physician at the time; NULL alerts are visible to every physician.
+class Alert(db.Model):
+    __table_args__ = (db.UniqueConstraint('user_id', 'kind', 'date'),
+                      db.Index('ix_alert_physician_id_id', 'physician_id', 'id'))
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    physician_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    kind = db.Column(db.String(20), nullable=False)
+    value = db.Column(db.Float, nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    acknowledged_at = db.Column(db.DateTime)
+
+# Version of a user's profile, daily logs or EPDS screenings, bumped in the same
+# transaction as every API write to them, so every API process sees the same
+# version. Profile versions live in the main database, the others next to the
+# rows on the patient's shard.
+class ResourceVersion(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    resource = db.Column(db.String(20), primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+    modified_at = db.Column(db.Float, nullable=False)
+
+# Per-patient tables that live on the patient's shard in sharded mode; users,
+# messages and alerts always stay in the main database
+SHARDED_MODELS = (DailyLog, EPDSScore, PatientSummary, PatientDailySummary, TrendRollup, ResourceVersion)
+
+# Serializers
+user_serializer = RowSerializer(User.__table__, exclude=('password_hash',))
+daily_log_serializer = RowSerializer(DailyLog.__table__)
+epds_score_serializer = RowSerializer(EPDSScore.__table__)
+message_serializer = RowSerializer(Message.__table__)
+alert_serializer = RowSerializer(Alert.__table__)
+
+# Full-text indexes, maintained by triggers (see search.py). daily_log_search
+# lives next to daily_log, on every shard in sharded mode.
+message_search = SearchIndex('message_search', Message.__table__, 'content', ('sender_id', 'receiver_id'), 'timestamp')
+daily_log_search = SearchIndex('daily_log_search', DailyLog.__table__, 'notes', ('user_id',), 'date')
+SEARCH_INDEXES = {'message': message_search, 'daily_log': daily_log_search}
+
 # Helper functions
 def token_required(f):
+    @wraps(f)
     def decorator(*args, **kwargs):
         token = request.headers.get('Authorization')
         if not token:
             return jsonify({'message': 'Token is missing'}), 401
-        try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = User.query.get(data['user_id'])
-        except:
-            return jsonify({'message': 'Token is invalid'}), 401
+        cached = token_cache.get(token)
+        # A snapshot is rechecked against the stored profile version at most every
+        # TOKEN_REVALIDATE_SECONDS, so a profile change made by another worker
+        # retires it everywhere within that time without a query per request
+        if cached is not None and time.monotonic() - cached[1] >= app.config['TOKEN_REVALIDATE_SECONDS']:
+            if resource_version(cached[0][0]['id'], 'profile') == cached[0][1]:
+                token_cache.mark_checked(token)
+            else:
+                cached = None
+        if cached is not None:
+            metrics.token_cache.inc('hit')
+            user_data, g.profile_version = cached[0]
+            current_user = attach_cached_user(user_data)
+        else:
+            metrics.token_cache.inc('miss')
+            try:
+                started = time.perf_counter()
+                try:
+                    data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+                finally:
+                    metrics.jwt_decode_seconds.observe(time.perf_counter() - started)
+                # Read before the row, so the row is at least as new as this profile version
+                g.profile_version = resource_version(data['user_id'], 'profile')
+                current_user = User.query.get(data['user_id'])
+            except:
+                return jsonify({'message': 'Token is invalid'}), 401
+            if current_user is None:
+                return jsonify({'message': 'Token is invalid'}), 401
+            if 'exp' in data:
+                user_data = {column.name: getattr(current_user, column.name) for column in User.__table__.columns}
+                token_cache.put(token, current_user.id, (user_data, g.profile_version), data['exp'])
         return f(current_user, *args, **kwargs)
     return decorator
 
+# Rebuild a persistent User from a cached snapshot without querying the database
+def attach_cached_user(user_data):
+    user = User(**user_data)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+# Patients a physician may see: those assigned to them plus unassigned ones, as for alerts
+def patients_of(physician):
+    return User.is_physician.isnot(True) & ((User.physician_id == physician.id) | User.physician_id.is_(None))
+
+# Error response when current_user may not read user_id's data, else None
+def patient_access_error(current_user, user_id):
+    if current_user.id == user_id:
+        return None
+    if not current_user.is_physician:
+        return jsonify({'message': 'Physician access required'}), 403
+    patient = db.session.execute(db.select(User.is_physician, User.physician_id).where(User.id == user_id)).first()
+    if patient is None or patient.is_physician:
+        return jsonify({'message': 'Patient not found'}), 404
+    if patient.physician_id not in (None, current_user.id):
+        return jsonify({'message': 'Patient is assigned to another physician'}), 403
+    return None
+
+# Session for a patient's rows in SHARDED_MODELS: their shard's in sharded mode
+def user_session(user_id):
+    return db.session if shard_router is None else shard_router.session(user_id)
+
+# (session, user ids on it) for every session holding some of `user_ids`
+def user_sessions(user_ids):
+    if shard_router is None:
+        return [(db.session, list(user_ids))]
+    return [(shard_router.sessions[index], shard_user_ids) for index, shard_user_ids in shard_router.group(user_ids).items()]
+
+@app.teardown_appcontext
+def remove_shard_sessions(error):
+    if shard_router is not None:
+        shard_router.remove_sessions()
+
+# Give new DailyLog/EPDSScore rows their ids up front; shards hand out ids from a
+# per-shard sequence so they stay unique across shards (see sharding.py)
+def assign_ids(connection, table, rows):
+    if shard_router is not None:
+        shard_router.assign_ids(connection, table, rows)
+
+# Apply after_id/limit keyset pagination and from/to date filters (YYYY-MM-DD, inclusive) from the query string
+def paginate(query, model, date_column):
+    return paginate_query(query, model, date_column, request.args)
+
+def paginate_query(query, model, date_column, args):
+    if 'after_id' in args:
+        query = query.filter(model.id > int(args['after_id']))
+    if 'since' in args:
+        query = query.filter(model.id > int(args['since']))
+    if 'from' in args:
+        query = query.filter(date_column >= date.fromisoformat(args['from']))
+    if 'to' in args:
+        # Compare against the next day so a date-only bound also covers timestamps on that day
+        query = query.filter(date_column < date.fromisoformat(args['to']) + timedelta(days=1))
+    query = query.order_by(model.id)
+    if 'limit' in args:
+        limit = int(args['limit'])
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        query = query.limit(min(limit, app.config['MAX_PAGE_SIZE']))
+    return query
+
+# Stream a select() as a chunked JSON array without holding the whole result in memory
+def stream_json(query, serializer, session=None):
+    session = session or db.session
+
+    def generate():
+        yield '['
+        result = session.execute(query.execution_options(yield_per=app.config['STREAM_CHUNK_SIZE']))
+        for i, row in enumerate(result):
+            yield (',' if i else '') + serializer.to_json(row)
+        yield ']'
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def list_response(query, model, date_column, serializer, session=None):
+    try:
+        query = paginate(query, model, date_column)
+    except ValueError:
+        return jsonify({'message': 'Invalid pagination or date filter'}), 400
+    return stream_json(query, serializer, session)
+
+# Bump the versions of `resources` for each of `user_ids` as part of a write job
+def bump_versions(connection, user_ids, resources):
+    table = ResourceVersion.__table__
+    insert = sqlite_insert(table)
+    modified_at = time.time()
+    connection.execute(insert.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.resource],
+        set_={'version': table.c.version + 1, 'modified_at': insert.excluded.modified_at}),
+        [{'user_id': user_id, 'resource': resource, 'version': 1, 'modified_at': modified_at}
+         for user_id in user_ids for resource in resources])
+
+# (version, modified_at) of a user's resource; (0, 0.0) before its first API write
+def resource_version(user_id, resource):
+    session = db.session if resource == 'profile' else user_session(user_id)
+    row = session.execute(db.select(ResourceVersion.version, ResourceVersion.modified_at).where(
+        ResourceVersion.user_id == user_id, ResourceVersion.resource == resource)).first()
+    return (row[0], row[1]) if row is not None else (0, 0.0)
+
+# Conditional GET for a patient's own resource. ETag and Last-Modified come from
+# the resource's ResourceVersion row, which write routes bump in the same
+# transaction as the data, so a matching If-None-Match (or, without one,
+# If-Modified-Since) gets a 304 after one primary-key lookup (none for
+# /profile) and an unchanged body is served from the cache. build() makes the full response; only 200s
+# are cached.
+def conditional_response(user_id, resource, build):
+    # token_required has already read (or recently rechecked) the caller's profile version
+    if resource == 'profile':
+        version, modified_at = g.profile_version
+    else:
+        version, modified_at = resource_version(user_id, resource)
+    # The modification time is part of the tag, so versions restarting (e.g.
+    # after a restore) never reproduce an old tag
+    etag = f'{user_id}-{resource}-{version}-{int(modified_at * 1000000)}'
+    headers = {'ETag': f'"{etag}"', 'Cache-Control': 'private, no-cache', 'Vary': 'Authorization'}
+    # Dates have one-second resolution, so Last-Modified is only sent once its
+    # second is over; a later write can then never share it
+    last_modified = datetime.fromtimestamp(int(modified_at), timezone.utc)
+    if int(modified_at) < int(time.time()):
+        headers['Last-Modified'] = http_datetime(last_modified)
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    else:
+        not_modified = ('Last-Modified' in headers and request.if_modified_since is not None
+                        and last_modified <= request.if_modified_since)
+    if not_modified:
+        metrics.response_cache.inc('not_modified')
+        return Response(status=304, headers=headers)
+    key = request.query_string
+    body = response_cache.get(user_id, resource, key, etag)
+    if body is not None:
+        metrics.response_cache.inc('hit')
+        return Response(body, mimetype='application/json', headers=headers)
+    metrics.response_cache.inc('miss')
+    response = app.make_response(build())
+    if response.status_code != 200:
+        return response
+    store = lambda body: response_cache.put(user_id, resource, key, etag, body)
+    if response.is_streamed:
+        response.response = cache_chunks(response.response, store, response_cache.max_body)
+    else:
+        store(response.get_data())
+    response.headers.update(headers)
+    return response
+
+# Pass a streamed body through and hand it to store() once complete, unless it outgrew max_size
+def cache_chunks(chunks, store, max_size):
+    body, size = [], 0
+    for chunk in chunks:
+        size += len(chunk)
+        if size <= max_size:
+            body.append(chunk)
+        yield chunk
+    if size <= max_size:
+        store(''.join(body).encode())
+
+# Client-writable fields and their Python types for each record type accepted by /sync
+SYNC_MODELS = {'daily_log': DailyLog, 'epds': EPDSScore}
+SYNC_FIELDS = {
+    record_type: {column.name: column.type.python_type for column in model.__table__.columns
+                  if column.name not in ('id', 'user_id', 'date')}
+    for record_type, model in SYNC_MODELS.items()
+}
+
+# Values the risk scorer accepts for the scored DailyLog fields, as the check-in
+# form stores them: the categorical answers as their 3/6/10 score, the sliders as answered
+SYNC_CHOICES = {'daily_log': {
+    'mental_health': set(MENTAL_HEALTH_SCORES.values()),
+    'stress_level': set(STRESS_SCORES.values()),
+    'physical_health': set(PHYSICAL_HEALTH_SCORES.values()),
+}}
+SYNC_RANGES = {'daily_log': {
+    **{field: (1, 5) for field in ('social_support', 'nutrition', 'sleep_quality', 'economic_stress')},
+    'sleep_hours': (0, 24),
+}}
+
+# Packed answers and their total for a list of ten EPDS option indices
+def epds_answers(answer_indices):
+    if not isinstance(answer_indices, list):
+        raise ValueError('answers must be ten option indices between 0 and 3')
+    packed = pack_epds(answer_indices)
+    return {'answers': packed, 'score': int(score_packed_epds(packed))}
+
+# Validate one decoded /sync record and return the row to insert
+def sync_row(record, user_id):
+    if not isinstance(record, dict):
+        raise ValueError('record must be a JSON object')
+    record_type = record.get('type')
+    if record_type not in SYNC_FIELDS:
+        raise ValueError(f"unknown record type {record_type!r}")
+    if not isinstance(record.get('date'), str):
+        raise ValueError('date is required')
+    row = {'user_id': user_id, 'date': date.fromisoformat(record['date'])}
+    if record_type == 'epds' and record.get('answers') is not None:
+        record = {'score': None, **record, **epds_answers(record['answers'])}
+    fields = SYNC_FIELDS[record_type]
+    for key, value in record.items():
+        if key in ('type', 'date'):
+            continue
+        if key not in fields:
+            raise ValueError(f'unknown field {key!r}')
+        expected = (int, float) if fields[key] is float else fields[key]
+        # bool is an int subclass, so true/false only pass for boolean fields
+        if value is not None and (not isinstance(value, expected) or isinstance(value, bool) and fields[key] is not bool):
+            raise ValueError(f'{key} must be of type {fields[key].__name__}')
+        choices = SYNC_CHOICES.get(record_type, {}).get(key)
+        if value is not None and choices is not None and value not in choices:
+            raise ValueError(f"{key} must be one of {', '.join(map(str, sorted(choices)))}")
+        low, high = SYNC_RANGES.get(record_type, {}).get(key, (None, None))
+        if value is not None and low is not None and not low <= value <= high:
+            raise ValueError(f'{key} must be between {low} and {high}')
+        row[key] = value
+    for key in fields:
+        row.setdefault(key, None)
+    if record_type == 'epds' and not (isinstance(row['score'], int) and 0 <= row['score'] <= 30):
+        raise ValueError('score must be an integer between 0 and 30')
+    return record_type, row
+
+# Row for a POST /daily_log or /epds body, validated like a /sync record of that type and dated today
+def posted_row(data, record_type, user_id):
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+    return sync_row({**data, 'type': record_type, 'date': datetime.now().date().isoformat()}, user_id)[1]
+
+# Fold new DailyLog rows into the per-day and per-patient summaries (same transaction as the insert)
+def record_daily_logs(connection, rows):
+    buckets = {}
+    for row in rows:
+        bucket = buckets.setdefault((row['user_id'], row['date']), {
+            'user_id': row['user_id'], 'date': row['date'], 'log_count': 0,
+            **{f'{metric}_{part}': 0 for metric in SUMMARY_METRICS for part in ('sum', 'count')}})
+        bucket['log_count'] += 1
+        for metric in SUMMARY_METRICS:
+            if row.get(metric) is not None:
+                bucket[f'{metric}_sum'] += row[metric]
+                bucket[f'{metric}_count'] += 1
+    record_trend_points(connection, ((row['user_id'], row['date'], metric, float(row[metric]))
+                                     for row in rows for metric in DAILY_LOG_TREND_METRICS if row.get(metric) is not None))
+    if not buckets:
+        return
+    table = PatientDailySummary.__table__
+    stmt = sqlite_insert(table)
+    counters = [name for name in buckets[next(iter(buckets))] if name not in ('user_id', 'date')]
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id', 'date'],
+        set_={name: table.c[name] + stmt.excluded[name] for name in counters}), list(buckets.values()))
+    last_dates = {}
+    for user_id, log_date in buckets:
+        last_dates[user_id] = max(log_date, last_dates.get(user_id, log_date))
+    stmt = sqlite_insert(PatientSummary.__table__)
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id'],
+        set_={'last_log_date': db.func.max(db.func.coalesce(PatientSummary.last_log_date, stmt.excluded.last_log_date),
+                                           stmt.excluded.last_log_date)}),
+        [{'user_id': user_id, 'last_log_date': log_date} for user_id, log_date in last_dates.items()])
+
+def trend_bucket(day, resolution):
+    if resolution == 'week':
+        return day - timedelta(days=day.weekday())
+    if resolution == 'month':
+        return day.replace(day=1)
+    return day
+
+# Fold (user_id, date, metric, value) points into every rollup resolution
+def record_trend_points(connection, points):
+    buckets = {}
+    for user_id, point_date, metric, value in points:
+        for resolution in TREND_RESOLUTIONS:
+            key = (user_id, resolution, metric, trend_bucket(point_date, resolution))
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = {'user_id': user_id, 'resolution': resolution, 'metric': metric, 'bucket': key[3],
+                                'count': 1, 'total': value, 'min_value': value, 'max_value': value}
+            else:
+                bucket['count'] += 1
+                bucket['total'] += value
+                bucket['min_value'] = min(bucket['min_value'], value)
+                bucket['max_value'] = max(bucket['max_value'], value)
+    if not buckets:
+        return
+    table = TrendRollup.__table__
+    stmt = sqlite_insert(table)
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id', 'resolution', 'metric', 'bucket'],
+        set_={'count': table.c.count + stmt.excluded['count'], 'total': table.c.total + stmt.excluded.total,
+              'min_value': db.func.min(table.c.min_value, stmt.excluded.min_value),
+              'max_value': db.func.max(table.c.max_value, stmt.excluded.max_value)}), list(buckets.values()))
+
+# Keep the latest EPDS score per patient; replayed older screenings never overwrite a newer one
+def record_epds_scores(connection, rows):
+    record_trend_points(connection, ((row['user_id'], row['date'], 'epds_score', float(row['score'])) for row in rows))
+    latest = {}
+    for row in rows:
+        current = latest.get(row['user_id'])
+        if current is None or row['date'] >= current['latest_epds_date']:
+            latest[row['user_id']] = {'user_id': row['user_id'], 'latest_epds_score': row['score'],
+                                      'latest_epds_date': row['date']}
+    if not latest:
+        return
+    stmt = sqlite_insert(PatientSummary.__table__)
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id'],
+        set_={'latest_epds_score': stmt.excluded.latest_epds_score, 'latest_epds_date': stmt.excluded.latest_epds_date},
+        where=(PatientSummary.latest_epds_date.is_(None)) | (PatientSummary.latest_epds_date <= stmt.excluded.latest_epds_date)),
+        list(latest.values()))
+
+# Latest EPDS plus rolling averages, read from at most one summary row and 28 daily rows
+def patient_summary(user_id, today=None):
+    today = today or date.today()
+    session = user_session(user_id)
+    summary = session.get(PatientSummary, user_id)
+    days = session.execute(db.select(PatientDailySummary).where(
+        PatientDailySummary.user_id == user_id,
+        PatientDailySummary.date > today - timedelta(days=max(SUMMARY_WINDOWS)),
+        PatientDailySummary.date <= today)).scalars().all()
+    result = {
+        'user_id': user_id,
+        'latest_epds_score': summary.latest_epds_score if summary else None,
+        'latest_epds_date': summary.latest_epds_date if summary else None,
+        'last_log_date': summary.last_log_date if summary else None,
+    }
+    for window in SUMMARY_WINDOWS:
+        in_window = [day for day in days if day.date > today - timedelta(days=window)]
+        result[f'log_count_{window}d'] = sum(day.log_count for day in in_window)
+        for metric in SUMMARY_METRICS:
+            count = sum(getattr(day, f'{metric}_count') for day in in_window)
+            total = sum(getattr(day, f'{metric}_sum') for day in in_window)
+            result[f'avg_{metric}_{window}d'] = total / count if count else None
+    return result
+
+# Message fan-out for /messages/stream
+def fetch_messages_after(last_id):
+    with app.app_context():
+        query = message_serializer.select().where(Message.id > last_id).order_by(Message.id).limit(1000)
+        return db.session.execute(query).mappings().all()
+
+def latest_message_id():
+    with app.app_context():
+        return db.session.execute(db.select(db.func.coalesce(db.func.max(Message.id), 0))).scalar()
+
+if app.config['MESSAGE_BUS'] == 'poll':
+    message_bus = PollingMessageBus(fetch_messages_after, latest_message_id)
+else:
+    message_bus = MessageBus()
+
+def message_event(message):
+    return f"id: {message['id']}\nevent: message\ndata: {message_serializer.mapping_to_json(message)}\n\n"
+
+# Server-sent events: replay the rows of `replay` (a select in id order, or None),
+# then forward live items from `subscription` until the client falls behind
+def event_stream(bus, subscription, last_id, replay, to_event):
+    def generate():
+        nonlocal last_id
+        try:
+            yield 'retry: 3000\n\n'
+            if replay is not None:
+                for row in db.session.execute(replay.execution_options(yield_per=app.config['STREAM_CHUNK_SIZE'])).mappings():
+                    last_id = row['id']
+                    yield to_event(row)
+            # Do not hold a database connection while waiting for new items
+            db.session.remove()
+            while not subscription.lagged:
+                item = subscription.get(timeout=app.config['MESSAGE_STREAM_HEARTBEAT'])
+                if item is None:
+                    yield ': keepalive\n\n'
+                elif item['id'] > last_id:
+                    last_id = item['id']
+                    yield to_event(item)
+        finally:
+            bus.unsubscribe(subscription)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Run job(connection) and commit it. In production mode the job joins the next
+# group commit; otherwise it runs on the request's own session. Either way the
+# caller only continues once the data is committed. Writes to SHARDED_MODELS pass
+# the patient's user_id, which in sharded mode runs them on that patient's shard.
+def run_write(job, user_id=None):
+    if shard_router is not None and user_id is not None:
+        return shard_router.run_write(user_id, job)
+    if group_commit_writer is not None:
+        return group_commit_writer.submit(job)
+    result = job(db.session.connection())
+    db.session.commit()
+    return result
+
+@app.errorhandler(WriteQueueFull)
+def write_queue_full(e):
+    response = jsonify({'message': 'Server is busy, please retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def hashing_busy():
+    response = jsonify({'message': 'Server is busy, please retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+# Risk alerts. Write routes enqueue (user_id, new daily logs, new EPDS rows) once
+# committed; the worker scores only those rows, so the cost grows with new data,
+# not with the patient count. As in /risk/batch, each row is paired with the
+# patient's latest record of the other kind on or before its own date: a log with
+# the screening from the summary when that is not newer than the log, and a
+# screening with the check-in found through the (user_id, date) index.
+def log_on_or_before(user_id, day):
+    return (daily_log_serializer.select().where(DailyLog.user_id == user_id, DailyLog.date <= day)
+            .order_by(DailyLog.date.desc(), DailyLog.id.desc()).limit(1))
+
+def epds_on_or_before(user_id, day):
+    return (db.select(EPDSScore.score).where(EPDSScore.user_id == user_id, EPDSScore.date <= day)
+            .order_by(EPDSScore.date.desc(), EPDSScore.id.desc()).limit(1))
+
+def alert_candidates(events):
+    users_with_logs = {user_id for user_id, logs, _ in events if logs}
+    latest_epds = {}
+    for session, user_ids in user_sessions(users_with_logs):
+        for user_id, score, score_date in session.execute(
+                db.select(PatientSummary.user_id, PatientSummary.latest_epds_score, PatientSummary.latest_epds_date)
+                .where(PatientSummary.user_id.in_(user_ids))):
+            latest_epds[user_id] = (score, score_date)
+
+    candidates = {}
+    paired_epds, paired_logs = {}, {}
+
+    def consider(user_id, kind, value, alert_date):
+        key = (user_id, kind, alert_date)
+        candidates[key] = max(value, candidates.get(key, value))
+
+    def epds_for(user_id, day):
+        score, score_date = latest_epds.get(user_id, (None, None))
+        if score_date is None or score_date <= day:
+            return score or 0
+        if (user_id, day) not in paired_epds:
+            paired_epds[user_id, day] = user_session(user_id).execute(epds_on_or_before(user_id, day)).scalar() or 0
+        return paired_epds[user_id, day]
+
+    def log_for(user_id, day):
+        if (user_id, day) not in paired_logs:
+            paired_logs[user_id, day] = user_session(user_id).execute(log_on_or_before(user_id, day)).mappings().first()
+        return paired_logs[user_id, day]
+
+    for user_id, logs, scores in events:
+        for row in scores:
+            if row['score'] >= EPDS_ALERT_THRESHOLD:
+                consider(user_id, 'epds', float(row['score']), row['date'])
+        if logs:
+            _, totals = score_batch(daily_log_factor_matrix(logs), [epds_for(user_id, row['date']) for row in logs])
+            for row, total in zip(logs, totals):
+                if total > TOTAL_RISK_ALERT_THRESHOLD:
+                    consider(user_id, 'total_risk', float(total), row['date'])
+        paired = [(row, log_for(user_id, row['date'])) for row in scores]
+        paired = [(row, log) for row, log in paired if log is not None]
+        if paired:
+            _, totals = score_batch(daily_log_factor_matrix([log for _, log in paired]), [row['score'] for row, _ in paired])
+            for (row, _), total in zip(paired, totals):
+                if total > TOTAL_RISK_ALERT_THRESHOLD:
+                    consider(user_id, 'total_risk', float(total), row['date'])
+    return candidates
+
+# Evaluate a batch of events and record all their alerts in one write
+def evaluate_alerts(events):
+    with app.app_context():
+        try:
+            candidates = alert_candidates(events)
+            if candidates:
+                # Most repeats are same-day check-ins that already raised their
+                # alert; a read filters them out so only new alerts take the write lock
+                user_ids = {user_id for user_id, _, _ in candidates}
+                dates = {alert_date for _, _, alert_date in candidates}
+                existing = db.session.execute(db.select(Alert.user_id, Alert.kind, Alert.date)
+                                              .where(Alert.user_id.in_(user_ids), Alert.date.in_(dates))).all()
+                for key in existing:
+                    candidates.pop(tuple(key), None)
+            if not candidates:
+                return []
+            user_ids = {user_id for user_id, _, _ in candidates}
+            physicians = dict(db.session.execute(db.select(User.id, User.physician_id).where(User.id.in_(user_ids))).all())
+            created_at = datetime.utcnow()
+
+            def write(connection):
+                created = []
+                for (user_id, kind, alert_date), value in candidates.items():
+                    alert = {'user_id': user_id, 'physician_id': physicians.get(user_id), 'kind': kind, 'value': value,
+                             'date': alert_date, 'created_at': created_at, 'acknowledged_at': None}
+                    result = connection.execute(sqlite_insert(Alert.__table__).on_conflict_do_nothing(), alert)
+                    if result.rowcount:
+                        created.append({**alert, 'id': result.inserted_primary_key[0]})
+                return created
+            return run_write(write)
+        finally:
+            db.session.remove()
+
+alert_bus = MessageBus()
+
+# Push a new alert to its physician's /alerts/stream; unassigned alerts are only listed by GET /alerts
+def notify_alert(alert):
+    app.logger.warning('Alert %s=%.2f for patient %s on %s', alert['kind'], alert['value'], alert['user_id'], alert['date'])
+    if alert['physician_id'] is not None:
+        alert_bus.publish_to([alert['physician_id']], alert)
+
+def alert_event(alert):
+    return f"id: {alert['id']}\nevent: alert\ndata: {alert_serializer.mapping_to_json(alert)}\n\n"
+
+alert_worker = AlertWorker(evaluate_alerts, notify_alert, app.config['ALERT_QUEUE_SIZE'])
+metrics.add_collector(lambda: ['# HELP alert_evaluations_dropped_total Alert evaluations dropped because the queue was full.',
+                               '# TYPE alert_evaluations_dropped_total counter',
+                               f'alert_evaluations_dropped_total {alert_worker.dropped}'])
+
 # Routes
 @app.route('/register', methods=['POST'])
 def register():
     data = request.json
-    hashed_password = generate_password_hash(data['password'])
-    new_user = User(username=data['username'], email=data['email'], password_hash=hashed_password)
-    db.session.add(new_user)
-    db.session.commit()
+    try:
+        hashed_password = password_hasher.hash(data['password'])
+    except HashingBusy:
+        return hashing_busy()
+    new_user = {'username': data['username'], 'email': data['email'], 'password_hash': hashed_password}
+    try:
+        run_write(lambda connection: connection.execute(User.__table__.insert(), new_user))
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': 'Username or email already in use'}), 409
     return jsonify({'message': 'User created successfully'}), 201
 
 @app.route('/login', methods=['POST'])
 def login():
     data = request.json
     user = User.query.filter_by(username=data['username']).first()
-    if user and check_password_hash(user.password_hash, data['password']):
+    try:
+        valid = user is not None and password_hasher.check(user.password_hash, data['password'])
+    except HashingBusy:
+        return hashing_busy()
+    if valid and password_hasher.needs_rehash(user.password_hash):
+        # Upgrading the hash is optional; when the hashers are busy it waits for the next login
+        try:
+            rehashed = password_hasher.hash(data['password'])
+        except HashingBusy:
+            rehashed = None
+        if rehashed is not None:
+            run_write(lambda connection: connection.execute(
+                User.__table__.update().where(User.id == user.id).values(password_hash=rehashed)))
+    if valid:
         token = jwt.encode({'user_id': user.id, 'exp': datetime.utcnow() + timedelta(hours=24)},
                            app.config['SECRET_KEY'], algorithm="HS256")
         return jsonify({'token': token})
@@ -88,61 +826,944 @@ def login():
 @app.route('/daily_log', methods=['POST'])
 @token_required
 def create_daily_log(current_user):
-    data = request.json
-    new_log = DailyLog(user_id=current_user.id, date=datetime.now().date(), **data)
-    db.session.add(new_log)
-    db.session.commit()
+    try:
+        new_log = posted_row(request.json, 'daily_log', current_user.id)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    def write(connection):
+        assign_ids(connection, DailyLog.__table__, [new_log])
+        connection.execute(DailyLog.__table__.insert(), new_log)
+        record_daily_logs(connection, [new_log])
+        bump_versions(connection, [current_user.id], ['daily_log'])
+    run_write(write, current_user.id)
+    alert_worker.enqueue((current_user.id, [new_log], []))
     return jsonify({'message': 'Daily log created successfully'}), 201
 
 @app.route('/daily_log', methods=['GET'])
 @token_required
 def get_daily_logs(current_user):
-    logs = DailyLog.query.filter_by(user_id=current_user.id).all()
-    return jsonify([{column.name: getattr(log, column.name) for column in log.__table__.columns} for log in logs])
+    logs = daily_log_serializer.select().where(DailyLog.user_id == current_user.id)
+    return conditional_response(current_user.id, 'daily_log', lambda: list_response(
+        logs, DailyLog, DailyLog.date, daily_log_serializer, user_session(current_user.id)))
 
 @app.route('/epds', methods=['POST'])
 @token_required
 def create_epds_score(current_user):
-    data = request.json
-    new_score = EPDSScore(user_id=current_user.id, date=datetime.now().date(), score=data['score'])
-    db.session.add(new_score)
-    db.session.commit()
+    try:
+        new_score = posted_row(request.json, 'epds', current_user.id)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    def write(connection):
+        assign_ids(connection, EPDSScore.__table__, [new_score])
+        connection.execute(EPDSScore.__table__.insert(), new_score)
+        record_epds_scores(connection, [new_score])
+        bump_versions(connection, [current_user.id], ['epds'])
+    run_write(write, current_user.id)
+    alert_worker.enqueue((current_user.id, [], [new_score]))
     return jsonify({'message': 'EPDS score recorded successfully'}), 201
 
+# Bulk ingest for offline clients: one JSON record per line, validated as the
+# body streams in and written with one executemany per table in a single transaction
+@app.route('/sync', methods=['POST'])
+@token_required
+def sync(current_user):
+    rows = {record_type: [] for record_type in SYNC_MODELS}
+    errors = []
+    # Blank lines are skipped without counting towards the limit; line numbers are only for errors
+    records = 0
+    for line_number, line in enumerate(request.stream, start=1):
+        if not line.strip():
+            continue
+        records += 1
+        if records > app.config['SYNC_MAX_RECORDS']:
+            return jsonify({'message': 'Too many records in one sync'}), 413
+        try:
+            record_type, row = sync_row(json.loads(line), current_user.id)
+        except ValueError as e:
+            errors.append({'line': line_number, 'error': str(e)})
+            continue
+        rows[record_type].append(row)
+
+    def write(connection):
+        for record_type, model in SYNC_MODELS.items():
+            if rows[record_type]:
+                assign_ids(connection, model.__table__, rows[record_type])
+                connection.execute(model.__table__.insert(), rows[record_type])
+        record_daily_logs(connection, rows['daily_log'])
+        record_epds_scores(connection, rows['epds'])
+        changed = [record_type for record_type in SYNC_MODELS if rows[record_type]]
+        if changed:
+            bump_versions(connection, [current_user.id], changed)
+    run_write(write, current_user.id)
+    if any(rows.values()):
+        alert_worker.enqueue((current_user.id, rows['daily_log'], rows['epds']))
+    inserted = {record_type: len(rows[record_type]) for record_type in SYNC_MODELS}
+    status = 400 if errors and not any(inserted.values()) else 201
+    return jsonify({'inserted': inserted, 'errors': errors}), status
+
 @app.route('/epds', methods=['GET'])
 @token_required
 def get_epds_scores(current_user):
-    scores = EPDSScore.query.filter_by(user_id=current_user.id).all()
-    return jsonify([{column.name: getattr(score, column.name) for column in score.__table__.columns} for score in scores])
+    scores = epds_score_serializer.select().where(EPDSScore.user_id == current_user.id)
+    return conditional_response(current_user.id, 'epds', lambda: list_response(
+        scores, EPDSScore, EPDSScore.date, epds_score_serializer, user_session(current_user.id)))
 
 @app.route('/message', methods=['POST'])
 @token_required
 def send_message(current_user):
     data = request.json
-    new_message = Message(sender_id=current_user.id, receiver_id=data['receiver_id'], content=data['content'])
-    db.session.add(new_message)
-    db.session.commit()
+    new_message = {'sender_id': current_user.id, 'receiver_id': data['receiver_id'], 'content': data['content'],
+                   'timestamp': datetime.utcnow()}
+    new_message['id'] = run_write(
+        lambda connection: connection.execute(Message.__table__.insert(), new_message).inserted_primary_key[0])
+    message_bus.publish(new_message)
     return jsonify({'message': 'Message sent successfully'}), 201
 
 @app.route('/messages', methods=['GET'])
 @token_required
 def get_messages(current_user):
-    messages = Message.query.filter((Message.sender_id == current_user.id) | (Message.receiver_id == current_user.id)).all()
-    return jsonify([{column.name: getattr(message, column.name) for column in message.__table__.columns} for message in messages])
+    messages = message_serializer.select().where((Message.sender_id == current_user.id) | (Message.receiver_id == current_user.id))
+    return list_response(messages, Message, Message.timestamp, message_serializer)
+
+# Server-sent events: replays messages after Last-Event-ID (or ?since=) from the database,
+# then pushes new ones as send_message commits them
+@app.route('/messages/stream', methods=['GET'])
+@token_required
+def stream_messages(current_user):
+    user_id = current_user.id
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        last_id = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'message': 'Invalid since cursor'}), 400
+    # Subscribe before replaying so nothing committed in between is missed
+    subscription = message_bus.subscribe(user_id)
+    replay = None
+    if last_id is not None:
+        replay = (message_serializer.select()
+                  .where(((Message.sender_id == user_id) | (Message.receiver_id == user_id)) & (Message.id > last_id))
+                  .order_by(Message.id))
+    return event_stream(message_bus, subscription, last_id or 0, replay, message_event)
+
+# Check the rows of a /risk/batch body before they are vectorized; ValueError names the bad value
+def risk_rows(rows):
+    if not isinstance(rows, list):
+        raise ValueError('rows must be a list of objects')
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            raise ValueError(f'rows[{index}] must be an object')
+        for key in (*FACTORS, 'epds_score'):
+            value = row.get(key)
+            if value is not None and (not isinstance(value, (int, float)) or not np.isfinite(value)):
+                raise ValueError(f'rows[{index}].{key} must be a number or null')
+    return rows
+
+@app.route('/risk/batch', methods=['POST'])
+@token_required
+def score_risk_batch(current_user):
+    data = request.json or {}
+    if not isinstance(data, dict):
+        return jsonify({'message': 'Expected a JSON object'}), 400
+    if 'rows' in data:
+        try:
+            rows = risk_rows(data['rows'])
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        epds_scores = [row.get('epds_score') or 0 for row in rows]
+    else:
+        # Rescore the caller's whole history, pairing each log with the latest EPDS score on or before its date
+        session = user_session(current_user.id)
+        rows = session.execute(daily_log_serializer.select().where(DailyLog.user_id == current_user.id)
+                                  .order_by(DailyLog.date, DailyLog.id)).mappings().all()
+        scores = session.execute(db.select(EPDSScore.date, EPDSScore.score).where(EPDSScore.user_id == current_user.id)
+                                    .order_by(EPDSScore.date, EPDSScore.id)).all()
+        log_days = np.array([row['date'].toordinal() for row in rows], dtype=np.int64)
+        score_days = np.array([score_date.toordinal() for score_date, _ in scores], dtype=np.int64)
+        score_values = np.array([0] + [score for _, score in scores], dtype=np.float64)
+        epds_scores = score_values[np.searchsorted(score_days, log_days, side='right')]
+    weighted, total = score_batch(daily_log_factor_matrix(rows), epds_scores)
+    return jsonify([{'id': row.get('id'), 'date': row.get('date'), 'epds_score': float(epds),
+                     'weighted_risk_score': float(w), 'total_risk_score': float(t)}
+                    for row, epds, w, t in zip(rows, epds_scores, weighted, total)])
+
+PANEL_SORT_KEYS = ('total_risk_score', 'weighted_risk_score', 'latest_epds_score', 'weeks_postpartum')
+
+# A physician's patients with their latest EPDS score and latest daily log, in one
+# query. The latest log is found per patient through the (user_id, date) index.
+def patient_panel_query(physician):
+    log = db.aliased(DailyLog)
+    latest_log_id = (db.select(log.id).where(log.user_id == User.id)
+                     .order_by(log.date.desc(), log.id.desc()).limit(1).correlate(User).scalar_subquery())
+    return (db.select(User.id.label('user_id'), User.username, User.weeks_postpartum,
+                      PatientSummary.latest_epds_score, PatientSummary.latest_epds_date,
+                      DailyLog.date.label('latest_log_date'), *[getattr(DailyLog, factor) for factor in FACTORS])
+            .outerjoin(PatientSummary, PatientSummary.user_id == User.id)
+            .outerjoin(DailyLog, DailyLog.id == latest_log_id)
+            .where(patients_of(physician)))
+
+# The same columns for `user_ids` on one shard, driven by their summary rows
+# (every patient with a log or screening has one); users come from the main database
+def shard_panel_query(user_ids):
+    log = db.aliased(DailyLog)
+    latest_log_id = (db.select(log.id).where(log.user_id == PatientSummary.user_id)
+                     .order_by(log.date.desc(), log.id.desc()).limit(1).correlate(PatientSummary).scalar_subquery())
+    return (db.select(PatientSummary.user_id, PatientSummary.latest_epds_score, PatientSummary.latest_epds_date,
+                      DailyLog.date.label('latest_log_date'), *[getattr(DailyLog, factor) for factor in FACTORS])
+            .outerjoin(DailyLog, DailyLog.id == latest_log_id)
+            .where(PatientSummary.user_id.in_(user_ids)))
+
+def read_all(engine, query):
+    with engine.connect() as connection:
+        return connection.execute(query).mappings().all()
+
+def patient_panel_rows(physician):
+    if shard_router is None:
+        return db.session.execute(patient_panel_query(physician)).mappings().all()
+    patients = db.session.execute(db.select(User.id.label('user_id'), User.username, User.weeks_postpartum)
+                                  .where(patients_of(physician))).mappings().all()
+    # Each shard reads only its own share of the physician's patients
+    grouped = shard_router.group(patient['user_id'] for patient in patients)
+    queries = [shard_panel_query(grouped.get(index, [])) for index in range(len(shard_router.engines))]
+    shard_rows = {row['user_id']: row for rows in shard_router.fan_out(read_all, queries) for row in rows}
+    empty = dict.fromkeys(queries[0].selected_columns.keys())
+    return [{**shard_rows.get(patient['user_id'], empty), **patient} for patient in patients]
+
+def patient_panel(physician):
+    rows = patient_panel_rows(physician)
+    has_log = np.array([row['latest_log_date'] is not None for row in rows], dtype=bool)
+    epds_scores = [row['latest_epds_score'] or 0 for row in rows]
+    weighted, total = score_batch(daily_log_factor_matrix(rows), epds_scores)
+    return [{'user_id': row['user_id'], 'username': row['username'], 'weeks_postpartum': row['weeks_postpartum'],
+             'latest_epds_score': row['latest_epds_score'], 'latest_epds_date': row['latest_epds_date'],
+             'latest_log_date': row['latest_log_date'],
+             'weighted_risk_score': float(w) if logged else None,
+             'total_risk_score': float(t) if logged or row['latest_epds_score'] is not None else None}
+            for row, logged, w, t in zip(rows, has_log, weighted, total)]
+
+@app.route('/physician/patients', methods=['GET'])
+@token_required
+def get_physician_patients(current_user):
+    if not current_user.is_physician:
+        return jsonify({'message': 'Physician access required'}), 403
+    sort = request.args.get('sort', 'total_risk_score')
+    order = request.args.get('order', 'desc')
+    if sort not in PANEL_SORT_KEYS or order not in ('asc', 'desc'):
+        return jsonify({'message': 'Invalid sort or order'}), 400
+    try:
+        top_k = int(request.args['top_k']) if 'top_k' in request.args else None
+        if top_k is not None and top_k < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({'message': 'Invalid top_k'}), 400
+    patients = patient_panel(current_user)
+    # Patients missing the sort value always rank last
+    if order == 'desc':
+        key = lambda patient: (patient[sort] is not None, patient[sort] or 0)
+        ranked = heapq.nlargest(top_k, patients, key=key) if top_k is not None else sorted(patients, key=key, reverse=True)
+    else:
+        key = lambda patient: (patient[sort] is None, patient[sort] or 0)
+        ranked = heapq.nsmallest(top_k, patients, key=key) if top_k is not None else sorted(patients, key=key)
+    return jsonify(ranked)
+
+# Item-level EPDS analytics over the screenings of `user_ids` (ids or a select of
+# them). Screenings are read as plain integer rows in large chunks and unpacked
+# with NumPy, never as ORM objects.
+def epds_item_stats(connection, user_ids, since, min_self_harm_score):
+    query = db.select(EPDSScore.id, EPDSScore.user_id, EPDSScore.answers).where(
+        EPDSScore.answers.is_not(None), EPDSScore.user_id.in_(user_ids))
+    if since is not None:
+        query = query.where(EPDSScore.date >= since)
+    query = query.order_by(EPDSScore.date, EPDSScore.id).execution_options(yield_per=app.config['ANALYTICS_CHUNK_SIZE'])
+    chunks = [np.fromiter(itertools.chain.from_iterable(chunk), dtype=np.int64).reshape(-1, 3)
+              for chunk in connection.execute(query).partitions()]
+    rows = np.concatenate(chunks) if chunks else np.empty((0, 3), dtype=np.int64)
+    distribution = epds_item_distribution(rows[:, 2])
+
+    # Rows are in date order, so the first hit in the reversed array is each patient's latest flagged screening
+    flagged = rows[flag_self_harm(rows[:, 2], min_self_harm_score)][::-1]
+    user_ids, first, counts = np.unique(flagged[:, 1], return_index=True, return_counts=True)
+    latest = flagged[first]
+    item_scores = epds_item_scores(latest[:, 2])[:, EPDS_SELF_HARM_ITEM]
+    totals = score_packed_epds(latest[:, 2])
+    dates = {}
+    for start in range(0, len(latest), app.config['STREAM_CHUNK_SIZE']):
+        ids = latest[start:start + app.config['STREAM_CHUNK_SIZE'], 0].tolist()
+        dates.update(connection.execute(db.select(EPDSScore.id, EPDSScore.date).where(EPDSScore.id.in_(ids))).all())
+    flags = [{'user_id': int(user_id), 'flagged_screenings': int(count), 'latest_date': dates[int(row[0])],
+              'latest_item_score': int(item_score), 'latest_epds_score': int(total)}
+             for user_id, count, row, item_score, total in zip(user_ids, counts, latest, item_scores, totals)]
+    return len(rows), distribution, flags
+
+def shard_epds_item_stats(engine, user_ids, since, min_self_harm_score):
+    with engine.connect() as connection:
+        return epds_item_stats(connection, user_ids, since, min_self_harm_score)
+
+# The physician's patients only. A patient's screenings all live on one shard, so
+# per-shard results only need adding up; users live in the main database, so each
+# shard is handed the ids of its own share of the patients.
+def epds_item_analytics(physician, since=None, min_self_harm_score=1):
+    patients = db.select(User.id).where(patients_of(physician))
+    if shard_router is None:
+        parts = [epds_item_stats(db.session.connection(), patients, since, min_self_harm_score)]
+    else:
+        grouped = shard_router.group(db.session.scalars(patients))
+        parts = shard_router.fan_out(shard_epds_item_stats, [grouped.get(index, []) for index in range(len(shard_router.engines))],
+                                     itertools.repeat(since), itertools.repeat(min_self_harm_score))
+    screenings = sum(count for count, _, _ in parts)
+    distribution = sum(part_distribution for _, part_distribution, _ in parts)
+    return {
+        'screenings': screenings,
+        'item_distribution': distribution.tolist(),
+        'item_means': (distribution @ np.arange(4) / max(screenings, 1)).tolist(),
+        'self_harm_flags': sorted((flag for _, _, flags in parts for flag in flags), key=lambda flag: flag['user_id']),
+    }
+
+@app.route('/physician/epds_items', methods=['GET'])
+@token_required
+def get_epds_item_analytics(current_user):
+    if not current_user.is_physician:
+        return jsonify({'message': 'Physician access required'}), 403
+    try:
+        since = date.fromisoformat(request.args['from']) if 'from' in request.args else None
+        min_score = int(request.args.get('min_item_score', 1))
+    except ValueError:
+        return jsonify({'message': 'Invalid from date or min_item_score'}), 400
+    return jsonify(epds_item_analytics(current_user, since, min_score))
+
+EXPORT_SERIALIZERS = {record_type: RowSerializer(model.__table__, iso_dates=True)
+                      for record_type, model in SYNC_MODELS.items()}
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+def export_query(record_type, user_ids=None, start=None, end=None):
+    model = SYNC_MODELS[record_type]
+    query = EXPORT_SERIALIZERS[record_type].select()
+    if user_ids is not None:
+        query = query.where(model.user_id.in_(user_ids))
+    if start is not None:
+        query = query.where(model.date >= start)
+    if end is not None:
+        query = query.where(model.date <= end)
+    return query
+
+# Databases holding the rows of `user_ids` (every patient's when None)
+def export_engines(user_ids=None):
+    if shard_router is None:
+        return [db.engine]
+    if user_ids is None:
+        return shard_router.engines
+    return [shard_router.engines[index] for index in sorted(shard_router.group(user_ids))]
+
+# Keyset batches of one table in id order, one database after the other. Each batch runs on a
+# fresh connection, so memory stays flat and no read transaction is held open for the whole export.
+def export_batches(record_type, **filters):
+    for engine in export_engines(filters.get('user_ids')):
+        yield from export_engine_batches(engine, record_type, **filters)
+
+def export_engine_batches(engine, record_type, **filters):
+    model = SYNC_MODELS[record_type]
+    query = export_query(record_type, **filters)
+    last_id = 0
+    while True:
+        with engine.connect() as connection:
+            batch = connection.execute(query.where(model.id > last_id).order_by(model.id)
+                                       .limit(app.config['EXPORT_BATCH_SIZE'])).all()
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1].id
+
+# Text chunks of the export: one CSV for a single table, or NDJSON records tagged
+# with their type. Both use ISO dates.
+def export_chunks(export_format, record_types, **filters):
+    for record_type in record_types:
+        serializer = EXPORT_SERIALIZERS[record_type]
+        prefix = f'{{"type":"{record_type}",'
+        if export_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(serializer.names)
+        for batch in export_batches(record_type, **filters):
+            if export_format == 'csv':
+                writer.writerows(batch)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            else:
+                yield ''.join(prefix + serializer.to_json(row)[1:] + '\n' for row in batch)
+        if export_format == 'csv' and buffer.tell():
+            yield buffer.getvalue()
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+# Research export of the physician's patients' daily logs and/or EPDS screenings, streamed in keyset batches
+@app.route('/export', methods=['GET'])
+@token_required
+def export(current_user):
+    if not current_user.is_physician:
+        return jsonify({'message': 'Physician access required'}), 403
+    export_format = request.args.get('format', 'csv')
+    default_tables = 'daily_log' if export_format == 'csv' else ','.join(EXPORT_SERIALIZERS)
+    record_types = request.args.get('tables', default_tables).split(',')
+    if export_format not in EXPORT_MIMETYPES or not record_types or not set(record_types) <= set(EXPORT_SERIALIZERS):
+        return jsonify({'message': 'Invalid format or tables'}), 400
+    if export_format == 'csv' and len(record_types) != 1:
+        return jsonify({'message': 'CSV exports one table at a time'}), 400
+    args = request.args
+    try:
+        filters = {
+            'user_ids': [int(user_id) for user_id in args['user_ids'].split(',')] if 'user_ids' in args else None,
+            'start': date.fromisoformat(args['from']) if 'from' in args else None,
+            'end': date.fromisoformat(args['to']) if 'to' in args else None,
+        }
+    except ValueError:
+        return jsonify({'message': 'Invalid user_ids or date filter'}), 400
+    patients = db.select(User.id).where(patients_of(current_user))
+    if filters['user_ids'] is None:
+        filters['user_ids'] = db.session.scalars(patients).all()
+    elif len(db.session.scalars(patients.where(User.id.in_(filters['user_ids']))).all()) < len(set(filters['user_ids'])):
+        return jsonify({'message': 'user_ids must all be your patients'}), 403
+    chunks = export_chunks(export_format, record_types, **filters)
+    filename = f"{'_'.join(record_types)}.{export_format}"
+    headers = {'Content-Disposition': f'attachment; filename={filename}'}
+    if request.args.get('gzip') == '1':
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return Response(stream_with_context(chunks), mimetype=EXPORT_MIMETYPES[export_format], headers=headers)
+
+# Physicians see their patients' alerts plus unassigned ones; patients see their own
+def alerts_query(user):
+    if user.is_physician:
+        visible = (Alert.physician_id == user.id) | Alert.physician_id.is_(None)
+    else:
+        visible = Alert.user_id == user.id
+    return alert_serializer.select().where(visible)
+
+@app.route('/alerts', methods=['GET'])
+@token_required
+def get_alerts(current_user):
+    query = alerts_query(current_user)
+    if request.args.get('unacknowledged') == '1':
+        query = query.where(Alert.acknowledged_at.is_(None))
+    return list_response(query, Alert, Alert.date, alert_serializer)
+
+@app.route('/alerts/<int:alert_id>/acknowledge', methods=['POST'])
+@token_required
+def acknowledge_alert(current_user, alert_id):
+    if not current_user.is_physician:
+        return jsonify({'message': 'Physician access required'}), 403
+    alert = db.session.execute(alerts_query(current_user).where(Alert.id == alert_id)).first()
+    if alert is None:
+        return jsonify({'message': 'Alert not found'}), 404
+    acknowledged_at = datetime.utcnow()
+    run_write(lambda connection: connection.execute(
+        Alert.__table__.update().where(Alert.id == alert_id, Alert.acknowledged_at.is_(None))
+        .values(acknowledged_at=acknowledged_at)))
+    return jsonify({'message': 'Alert acknowledged'})
+
+@app.route('/alerts/stream', methods=['GET'])
+@token_required
+def stream_alerts(current_user):
+    if not current_user.is_physician:
+        return jsonify({'message': 'Physician access required'}), 403
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        last_id = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'message': 'Invalid since cursor'}), 400
+    subscription = alert_bus.subscribe(current_user.id)
+    replay = None
+    if last_id is not None:
+        replay = alerts_query(current_user).where(Alert.id > last_id).order_by(Alert.id)
+    return event_stream(alert_bus, subscription, last_id or 0, replay, alert_event)
+
+@app.route('/summary', methods=['GET'])
+@token_required
+def get_summary(current_user):
+    return jsonify(patient_summary(current_user.id))
+
+@app.route('/summary/<int:user_id>', methods=['GET'])
+@token_required
+def get_patient_summary(current_user, user_id):
+    error = patient_access_error(current_user, user_id)
+    if error is not None:
+        return error
+    return jsonify(patient_summary(user_id))
+
+# Mean/min/max per bucket for each requested metric, aggregated from the rollups in SQL
+def trends_query(user_id, args):
+    resolution = args.get('resolution', 'day')
+    metrics = args['metrics'].split(',') if args.get('metrics') else list(TREND_METRICS)
+    if resolution not in TREND_RESOLUTIONS or not set(metrics) <= set(TREND_METRICS):
+        raise ValueError('unknown resolution or metric')
+    query = db.select(TrendRollup.metric, TrendRollup.bucket, (TrendRollup.total / TrendRollup.count).label('mean'),
+                      TrendRollup.min_value, TrendRollup.max_value, TrendRollup.count).where(
+        TrendRollup.user_id == user_id, TrendRollup.resolution == resolution, TrendRollup.metric.in_(metrics))
+    if 'from' in args:
+        query = query.where(TrendRollup.bucket >= trend_bucket(date.fromisoformat(args['from']), resolution))
+    if 'to' in args:
+        query = query.where(TrendRollup.bucket <= date.fromisoformat(args['to']))
+    return resolution, metrics, query.order_by(TrendRollup.metric, TrendRollup.bucket)
+
+def trends_response(user_id):
+    try:
+        resolution, metrics, query = trends_query(user_id, request.args)
+    except ValueError:
+        return jsonify({'message': 'Invalid resolution, metrics or date filter'}), 400
+    series = {metric: [] for metric in metrics}
+    for row in user_session(user_id).execute(query):
+        series[row.metric].append({'date': row.bucket, 'mean': row.mean, 'min': row.min_value,
+                                   'max': row.max_value, 'count': row.count})
+    return jsonify({'resolution': resolution, 'series': series})
+
+@app.route('/trends', methods=['GET'])
+@token_required
+def get_trends(current_user):
+    return trends_response(current_user.id)
+
+@app.route('/trends/<int:user_id>', methods=['GET'])
+@token_required
+def get_patient_trends(current_user, user_id):
+    error = patient_access_error(current_user, user_id)
+    if error is not None:
+        return error
+    return trends_response(user_id)
+
+# Keyword search over one user's messages and daily-log notes. The FTS5 indexes
+# return only that user's matches, which are ranked here and paged with offset.
+@app.route('/search', methods=['GET'])
+@token_required
+def search(current_user):
+    try:
+        user_id = int(request.args.get('user_id', current_user.id))
+        limit = min(int(request.args.get('limit', app.config['SEARCH_PAGE_SIZE'])), app.config['MAX_PAGE_SIZE'])
+        offset = int(request.args.get('offset', 0))
+        if limit < 1 or offset < 0:
+            raise ValueError
+    except ValueError:
+        return jsonify({'message': 'Invalid user_id, limit or offset'}), 400
+    error = patient_access_error(current_user, user_id)
+    if error is not None:
+        return error
+    record_types = request.args.get('types', ','.join(SEARCH_INDEXES)).split(',')
+    if not set(record_types) <= SEARCH_INDEXES.keys():
+        return jsonify({'message': f"types must be among {', '.join(SEARCH_INDEXES)}"}), 400
+    try:
+        match = match_expression(request.args.get('q', ''), user_id)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    matches = []
+    truncated = False
+    max_matches = app.config['SEARCH_MAX_MATCHES']
+    for record_type in dict.fromkeys(record_types):
+        session = user_session(user_id) if record_type == 'daily_log' else db.session
+        # One row past the cap tells whether older matches were left out
+        rows = session.execute(SEARCH_INDEXES[record_type].query(match, max_matches + 1)).mappings().all()
+        truncated = truncated or len(rows) > max_matches
+        matches.extend(dict(row, type=record_type) for row in rows[:max_matches])
+    ranked = rank_matches(matches)
+    return jsonify({'results': [search_result(result) for result in ranked[offset:offset + limit]],
+                    'next_offset': offset + limit if len(ranked) > offset + limit else None,
+                    'truncated': truncated})
+
+def search_result(result):
+    if result['date'] is not None:
+        result['date'] = http_datetime(result['date']) if isinstance(result['date'], datetime) else http_date(result['date'])
+    return result
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/hashing', methods=['GET'])
+def hashing_metrics():
+    return jsonify(password_hasher.stats.snapshot())
+
+# Fields PUT /profile may change. Role, password and id never come from the request.
+PROFILE_FIELDS = ('username', 'email', 'weeks_postpartum', 'delivery_date', 'physician_id')
+
+# Column values for a PUT /profile body; ValueError names what is wrong with it
+def profile_values(data):
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+    unknown = data.keys() - set(PROFILE_FIELDS)
+    if unknown:
+        raise ValueError(f"Cannot update {', '.join(sorted(unknown))}; allowed fields are {', '.join(PROFILE_FIELDS)}")
+    values = {}
+    for key in ('username', 'email'):
+        if key in data:
+            if not isinstance(data[key], str) or not data[key].strip():
+                raise ValueError(f'{key} must be a non-empty string')
+            values[key] = data[key]
+    for key in ('weeks_postpartum', 'physician_id'):
+        if key in data:
+            value = data[key]
+            if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 0):
+                raise ValueError(f'{key} must be a non-negative integer or null')
+            values[key] = value
+    if 'delivery_date' in data:
+        try:
+            values['delivery_date'] = None if data['delivery_date'] is None else datetime.fromisoformat(data['delivery_date'])
+        except (TypeError, ValueError):
+            raise ValueError('delivery_date must be an ISO 8601 date or null')
+    return values
 
 @app.route('/profile', methods=['GET', 'PUT'])
 @token_required
 def profile(current_user):
     if request.method == 'GET':
-        return jsonify({column.name: getattr(current_user, column.name) for column in current_user.__table__.columns if column.name != 'password_hash'})
+        # current_user was read at (or after) g.profile_version, the version the ETag names
+        return conditional_response(current_user.id, 'profile',
+                                    lambda: jsonify(user_serializer.from_object(current_user)))
     elif request.method == 'PUT':
-        data = request.json
-        for key, value in data.items():
-            setattr(current_user, key, value)
-        db.session.commit()
+        try:
+            values = profile_values(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        if values.get('physician_id') is not None and db.session.execute(db.select(User.id).where(
+                User.id == values['physician_id'], User.is_physician.is_(True))).first() is None:
+            return jsonify({'message': 'physician_id must be a physician'}), 400
+        if values:
+            def write(connection):
+                connection.execute(User.__table__.update().where(User.id == current_user.id).values(**values))
+                bump_versions(connection, [current_user.id], ['profile'])
+            try:
+                run_write(write)
+            except IntegrityError:
+                db.session.rollback()
+                return jsonify({'message': 'Username or email already in use'}), 409
+        token_cache.invalidate_user(current_user.id)
         return jsonify({'message': 'Profile updated successfully'})
 
+# Database maintenance
+# create_all() only creates missing tables, so columns and indexes added to
+# existing tables (e.g. an older postpartum_health.db) are created here.
+# Only nullable columns can be added in place.
+def migrate_columns(engine, tables):
+    preparer = engine.dialect.identifier_preparer
+    inspector = db.inspect(engine)
+    with engine.begin() as connection:
+        for table in tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    connection.exec_driver_sql(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN '
+                                               f'{preparer.format_column(column)} {column.type.compile(engine.dialect)}')
+
+def migrate_indexes(engine, tables):
+    for table in tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+# Highest DailyLog/EPDSScore id in any of `engines`
+def max_ids(engines):
+    floors = {}
+    for engine in engines:
+        with engine.connect() as connection:
+            for model in SYNC_MODELS.values():
+                value = connection.execute(db.select(db.func.max(model.id))).scalar() or 0
+                floors[model.__table__.name] = max(value, floors.get(model.__table__.name, 0))
+    return floors
+
+# create_all() for the main database, plus the SHARDED_MODELS tables on every shard.
+# Shard ids start above those already in the main database, which rebalance-shards moves in.
+def create_tables():
+    db.create_all()
+    with db.engine.begin() as connection:
+        for index in SEARCH_INDEXES.values():
+            index.create(connection)
+    if shard_router is not None:
+        shard_router.create_tables([model.__table__ for model in SHARDED_MODELS], max_ids([db.engine]))
+        for engine in shard_router.engines:
+            with engine.begin() as connection:
+                daily_log_search.create(connection)
+
+def migrate_schema():
+    create_tables()
+    migrate_columns(db.engine, db.metadata.sorted_tables)
+    migrate_indexes(db.engine, db.metadata.sorted_tables)
+    for engine in (shard_router.engines if shard_router else []):
+        migrate_columns(engine, [model.__table__ for model in SHARDED_MODELS])
+        migrate_indexes(engine, [model.__table__ for model in SHARDED_MODELS])
+
+# Hot-path queries that must be served from an index, never a full table scan
+def hot_queries():
+    return {
+        'daily_log by user': paginate_query(daily_log_serializer.select().where(DailyLog.user_id == 1),
+                                            DailyLog, DailyLog.date, {}),
+        'daily_log by user and date': paginate_query(daily_log_serializer.select().where(DailyLog.user_id == 1),
+                                                     DailyLog, DailyLog.date,
+                                                     {'from': '2024-01-01', 'to': '2024-12-31', 'after_id': '1', 'limit': '10'}),
+        'epds by user': paginate_query(epds_score_serializer.select().where(EPDSScore.user_id == 1),
+                                       EPDSScore, EPDSScore.date, {}),
+        'physician patient panel': patient_panel_query(User(id=1, is_physician=True)),
+        'physician patient panel (shard)': shard_panel_query([1, 2]),
+        'latest epds': db.select(EPDSScore.score).where(EPDSScore.user_id == 1).order_by(EPDSScore.date.desc()).limit(1),
+        'epds on or before a date': epds_on_or_before(1, date(2024, 1, 1)),
+        'daily_log on or before a date': log_on_or_before(1, date(2024, 1, 1)),
+        'export by users': export_query('daily_log', [1, 2]).where(DailyLog.id > 0).order_by(DailyLog.id).limit(1),
+        'alerts by physician': paginate_query(alerts_query(User(id=1, is_physician=True)), Alert, Alert.date, {}),
+        'alerts by patient': paginate_query(alerts_query(User(id=1, is_physician=False)), Alert, Alert.date, {}),
+        'trends by user': trends_query(1, {'resolution': 'week', 'from': '2024-01-01'})[2],
+        'search messages': message_search.query(match_expression('crying', 1), 10),
+        'search daily_log notes': daily_log_search.query(match_expression('crying', 1), 10),
+        'messages by participant': paginate_query(
+            message_serializer.select().where((Message.sender_id == 1) | (Message.receiver_id == 1)),
+            Message, Message.timestamp, {}),
+    }
+
+def query_plan(query):
+    compiled = query.compile(db.engine, compile_kwargs={'render_postcompile': True})
+    params = tuple(None for _ in compiled.positiontup)
+    with db.engine.connect() as connection:
+        plan = [row[-1] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params)]
+        # The driver caches prepared statements, which would keep a stale plan after a schema change
+        connection.invalidate()
+    return plan
+
+def full_scans():
+    scanned_tables = ('daily_log', 'epds_score', 'message', 'trend_rollup', 'alert')
+    failures = {}
+    for name, query in hot_queries().items():
+        plan = query_plan(query)
+        if any(detail.split()[:2] == ['SCAN', table] or detail.split()[:3] == ['SCAN', 'TABLE', table]
+               for detail in plan for table in scanned_tables):
+            failures[name] = plan
+    return failures
+
+@app.cli.command('migrate-indexes')
+def migrate_indexes_command():
+    migrate_schema()
+    print('Columns and indexes are up to date')
+
+def clear_summaries(connection):
+    connection.execute(PatientDailySummary.__table__.delete())
+    connection.execute(PatientSummary.__table__.delete())
+    connection.execute(TrendRollup.__table__.delete())
+
+# Recompute every patient summary from raw history, e.g. for a database that predates the summary tables
+def rebuild_database_summaries(connection):
+    clear_summaries(connection)
+    logs = db.select(DailyLog.user_id, DailyLog.date, *[getattr(DailyLog, metric) for metric in DAILY_LOG_TREND_METRICS])
+    for chunk in connection.execute(logs.execution_options(yield_per=app.config['STREAM_CHUNK_SIZE'])).mappings().partitions():
+        record_daily_logs(connection, chunk)
+    scores = db.select(EPDSScore.user_id, EPDSScore.date, EPDSScore.score)
+    for chunk in connection.execute(scores.execution_options(yield_per=app.config['STREAM_CHUNK_SIZE'])).mappings().partitions():
+        record_epds_scores(connection, chunk)
+
+def rebuild_shard_summaries(engine):
+    with engine.begin() as connection:
+        rebuild_database_summaries(connection)
+
+# Every shard is rebuilt at the same time
+def rebuild_summaries():
+    if shard_router is None:
+        rebuild_database_summaries(db.session.connection())
+        db.session.commit()
+    else:
+        shard_router.fan_out(rebuild_shard_summaries)
+
+@app.cli.command('rebuild-summaries')
+def rebuild_summaries_command():
+    create_tables()
+    rebuild_summaries()
+    print('Patient summaries rebuilt')
+
+# Move every daily log and screening to where it belongs under the current
+# SHARD_COUNT: its patient's shard, or the main database with sharding off. The
+# main database and every shard file next to it are read, so shards left over
+# from a larger SHARD_COUNT are drained too. Summaries are then rebuilt wherever
+# rows now live and cleared everywhere else. Returns rows moved per table and the
+# leftover shard files, which are empty afterwards.
+def rebalance_shards():
+    create_tables()
+    url = db.engine.url
+    targets = shard_router.engines if shard_router else [db.engine]
+    leftover = [create_shard_engine(url, index) for index in existing_shards(url)
+                if shard_router is None or index >= shard_router.count]
+    sources = [db.engine, *(shard_router.engines if shard_router else []), *leftover]
+
+    def destination(row):
+        return targets[shard_router.shard_for(row['user_id'])] if shard_router else db.engine
+
+    moved = {}
+    for source in sources:
+        for model in SYNC_MODELS.values():
+            moved[model.__table__.name] = moved.get(model.__table__.name, 0) + move_rows(
+                source, model.__table__, destination, app.config['SHARD_REBALANCE_BATCH_SIZE'])
+    if shard_router is not None:
+        shard_router.create_tables([model.__table__ for model in SHARDED_MODELS], max_ids(targets))
+    for source in sources:
+        if source not in targets:
+            with source.begin() as connection:
+                clear_summaries(connection)
+                connection.execute(ResourceVersion.__table__.delete().where(ResourceVersion.resource != 'profile'))
+    rebuild_summaries()
+    # Rows arrived from other files, so every patient's logs and screenings get a new version
+    for target in targets:
+        with target.begin() as connection:
+            user_ids = connection.execute(db.union(db.select(DailyLog.user_id), db.select(EPDSScore.user_id))).scalars().all()
+            if user_ids:
+                bump_versions(connection, user_ids, SYNC_MODELS)
+    for engine in leftover:
+        engine.dispose()
+    return moved, [engine.url.database for engine in leftover]
+
+@app.cli.command('rebalance-shards')
+def rebalance_shards_command():
+    moved, unused = rebalance_shards()
+    for table, count in moved.items():
+        print(f'Moved {count} {table} rows')
+    for path in unused:
+        print(f'{path} is no longer used and can be deleted')
+
+def rebuild_shard_search_index(engine):
+    with engine.begin() as connection:
+        daily_log_search.rebuild(connection)
+
+def rebuild_search_indexes():
+    with db.engine.begin() as connection:
+        for index in SEARCH_INDEXES.values():
+            index.rebuild(connection)
+    if shard_router is not None:
+        shard_router.fan_out(rebuild_shard_search_index)
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    create_tables()
+    rebuild_search_indexes()
+    print('Search indexes rebuilt')
+
+# Every daily log as (user id, day number, raw factor values) and every
+# screening as (user id, day number, EPDS total), read in chunks into arrays
+def calibration_history(connection):
+    chunk_size = app.config['ANALYTICS_CHUNK_SIZE']
+
+    def read(query, columns):
+        # Plain tuples convert far faster than Row objects
+        chunks = [np.array([tuple(row) for row in chunk], dtype=np.float64).reshape(-1, columns)
+                  for chunk in connection.execute(query.execution_options(yield_per=chunk_size)).partitions()]
+        return np.concatenate(chunks) if chunks else np.empty((0, columns))
+
+    logs = read(db.select(DailyLog.user_id, db.func.julianday(DailyLog.date), *(getattr(DailyLog, factor) for factor in FACTORS))
+                .order_by(DailyLog.id), 2 + len(FACTORS))
+    screenings = read(db.select(EPDSScore.user_id, db.func.julianday(EPDSScore.date), EPDSScore.score)
+                      .order_by(EPDSScore.id), 3)
+    return logs, screenings
+
+def shard_calibration_history(engine):
+    with engine.connect() as connection:
+        return calibration_history(connection)
+
+# Paired daily logs and follow-up screenings of every patient, loaded once.
+# A patient's rows all live on one shard, so shards are read in parallel and
+# their arrays simply concatenated.
+def load_calibration_history(follow_up_days, outcome_levels):
+    if shard_router is None:
+        parts = [calibration_history(db.session.connection())]
+    else:
+        parts = shard_router.fan_out(shard_calibration_history)
+    logs = np.concatenate([part_logs for part_logs, _ in parts])
+    screenings = np.concatenate([part_screenings for _, part_screenings in parts])
+    current, follow_up, paired = calibration.pair_follow_ups(
+        logs[:, 0].astype(np.int64), logs[:, 1].astype(np.int64), screenings[:, 0].astype(np.int64),
+        screenings[:, 1].astype(np.int64), screenings[:, 2], follow_up_days)
+    return calibration.History(raw_factor_scores(logs[paired, 2:]), current[paired], follow_up[paired], outcome_levels)
+
+def format_rates(sensitivity, specificity, outcome_levels):
+    return ', '.join(f'EPDS {level}+ sensitivity {sens:.3f} specificity {spec:.3f}'
+                     for level, sens, spec in zip(outcome_levels, sensitivity, specificity))
+
+# Fit the risk factor weights and band cut-offs to historical outcomes: the
+# total risk score of each daily log should predict the patient's next EPDS
+# screening. Every candidate's cut-offs are fitted by Youden's J; the candidate
+# with the best mean J over the outcome levels becomes the next version of the
+# weights file, which the API and Streamlit pages load when they start.
+@app.cli.command('calibrate-risk')
+@click.option('--search', type=click.Choice(['random', 'grid']), default='random', show_default=True)
+@click.option('--candidates', default=100000, show_default=True, help='Weight vectors drawn by a random search.')
+@click.option('--grid-step', default=0.1, show_default=True, help='Weight step of a grid search.')
+@click.option('--threshold-step', default=calibration.THRESHOLD_STEP, show_default=True, help='Cut-off step.')
+@click.option('--follow-up-days', default=calibration.FOLLOW_UP_DAYS, show_default=True)
+@click.option('--outcome-levels', default=','.join(map(str, calibration.OUTCOME_LEVELS)), show_default=True,
+              help='Follow-up EPDS scores the mild, moderate and high cut-offs predict.')
+@click.option('--min-sensitivity', default=0.0, show_default=True, help='Lowest sensitivity a cut-off may have.')
+@click.option('--workers', default=0, help='Processes to search with (default: one per CPU).')
+@click.option('--seed', type=int, help='Seed of a random search.')
+@click.option('--report', type=click.Path(dir_okay=False), help='Write every candidate\'s results to this CSV file.')
+@click.option('--output', type=click.Path(dir_okay=False), default=RISK_WEIGHTS_FILE, show_default=True)
+@click.option('--dry-run', is_flag=True, help='Report only; leave the weights file alone.')
+def calibrate_risk_command(search, candidates, grid_step, threshold_step, follow_up_days, outcome_levels,
+                           min_sensitivity, workers, seed, report, output, dry_run):
+    outcome_levels = tuple(int(level) for level in outcome_levels.split(','))
+    if len(outcome_levels) != len(RISK_BANDS):
+        raise click.BadParameter(f'Give {len(RISK_BANDS)} outcome levels', param_hint='--outcome-levels')
+    started = time.perf_counter()
+    create_tables()
+    history = load_calibration_history(follow_up_days, outcome_levels)
+    print(f'Loaded {history.rows} daily logs with a follow-up screening within {follow_up_days} days '
+          f'({len(history.counts)} distinct rows) in {time.perf_counter() - started:.1f}s')
+    if not history.rows:
+        raise SystemExit('No daily logs have a follow-up screening to calibrate against')
+    print('Follow-ups reaching ' + ', '.join(f'EPDS {level}+: {count}'
+                                             for level, count in zip(outcome_levels, history.positives())))
+    print(f'Current model: {format_rates(*calibration.evaluate_model(history, weight_vector(), RISK_BANDS), outcome_levels)}')
+
+    if search == 'grid':
+        weights = calibration.grid_weights(grid_step)
+    else:
+        weights = calibration.random_weights(candidates, seed)
+    # The weights in use compete too, with refitted cut-offs
+    weights = np.vstack([weight_vector(), weights])
+    started = time.perf_counter()
+    results = calibration.calibrate(history, weights, workers or None, threshold_step, min_sensitivity)
+    print(f'Evaluated {len(weights)} candidates in {time.perf_counter() - started:.1f}s')
+    if report:
+        calibration.write_report(report, results, outcome_levels)
+        print(f'Wrote {report}')
+
+    order = calibration.ranking(results)
+    best = order[0]
+    if np.isnan(results['youden'][best]):
+        raise SystemExit('No candidate has cut-offs meeting --min-sensitivity')
+    print('Best candidates, weights in the order ' + ', '.join(FACTORS))
+    for rank, index in enumerate(order[:10], 1):
+        if np.isnan(results['youden'][index]):
+            break
+        weights_text = ' '.join(f'{value:.3f}' for value in results['weights'][index])
+        bands_text = '/'.join(f'{cutoff:g}' for cutoff in results['risk_bands'][index])
+        print(f'{rank:2d}. J {results["youden"][index]:.4f}  bands {bands_text}  weights {weights_text}')
+    print(f'Best: {format_rates(results["sensitivity"][best], results["specificity"][best], outcome_levels)}')
+    if dry_run:
+        return
+    version = load_risk_model(output)['version'] + 1
+    calibration.write_risk_model(
+        output, version, results['weights'][best], results['risk_bands'][best], outcome_levels=list(outcome_levels),
+        follow_up_days=follow_up_days, daily_logs=history.rows, candidates=len(weights), search=search,
+        sensitivity=[round(float(value), 4) for value in results['sensitivity'][best]],
+        specificity=[round(float(value), 4) for value in results['specificity'][best]])
+    print(f'Wrote version {version} to {output}; restart the API and the Streamlit app to use it')
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    migrate_schema()
+    failures = full_scans()
+    for name, plan in failures.items():
+        print(f'Full table scan in {name}: {plan}')
+    if failures:
+        raise SystemExit(1)
+    print('All hot queries use an index')
+
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        migrate_schema()
     app.run(debug=True)
\ No newline at end of file
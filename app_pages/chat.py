@@ -0,0 +1,12 @@
+# app_pages/chat.py
+import streamlit as st
+
+
+def render():
+    st.title("Chat with Your Healthcare Provider")
+    
+    st.write("This is a placeholder for the chat functionality. In a full implementation, you would integrate a secure messaging system here.")
+    
+    message = st.text_input("Type your message here:")
+    if st.button("Send"):
+        st.success("Message sent to your healthcare provider!")
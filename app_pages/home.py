@@ -0,0 +1,239 @@
+# app_pages/home.py
+import datetime
+import streamlit as st
+from risk_model import (WEIGHTS, MENTAL_HEALTH_SCORES, STRESS_SCORES, PHYSICAL_HEALTH_SCORES,
+                        HORMONAL_CHANGES_SCORES, calculate_weighted_score, risk_band, score_epds)
+import run_timing
+
+# EPDS Test
+EPDS_QUESTIONS = [
+    "I have been able to laugh and see the funny side of things",
+    "I have looked forward with enjoyment to things",
+    "I have blamed myself unnecessarily when things went wrong",
+    "I have been anxious or worried for no good reason",
+    "I have felt scared or panicky for no good reason",
+    "Things have been getting to me",
+    "I have been so unhappy that I have had difficulty sleeping",
+    "I have felt sad or miserable",
+    "I have been so unhappy that I have been crying",
+    "The thought of harming myself has occurred to me"
+]
+
+EPDS_OPTIONS = [
+    ["As much as I always could", "Not quite so much now", "Definitely not so much now", "Not at all"],
+    ["As much as I ever did", "Rather less than I used to", "Definitely less than I used to", "Hardly at all"],
+    ["Yes, most of the time", "Yes, some of the time", "Not very often", "No, never"],
+    ["Yes, very often", "Yes, sometimes", "Hardly ever", "No, not at all"],
+    ["Yes, quite a lot", "Yes, sometimes", "No, not much", "No, not at all"],
+    ["Yes, most of the time I haven't been able to cope at all", "Yes, sometimes I haven't been coping as well as usual", "No, most of the time I have coped quite well", "No, I have been coping as well as ever"],
+    ["Yes, most of the time", "Yes, sometimes", "Not very often", "No, not at all"],
+    ["Yes, most of the time", "Yes, quite often", "Not very often", "No, not at all"],
+    ["Yes, most of the time", "Yes, quite often", "Only occasionally", "No, never"],
+    ["Yes, quite often", "Sometimes", "Hardly ever", "Never"]
+]
+
+
+def render():
+    st.title("Postpartum Health Tracker")
+    
+    # Display current date
+    current_date = datetime.date.today()
+    st.subheader(current_date.strftime("%B %d"))
+
+    # Calendar-like date picker
+    col1, col2, col3, col4, col5, col6, col7 = st.columns(7)
+    weekdays = ["S", "M", "T", "W", "T", "F", "S"]
+    for i, day in enumerate(range(current_date.day - 3, current_date.day + 4)):
+        cols = [col1, col2, col3, col4, col5, col6, col7]
+        with cols[i]:
+            st.write(weekdays[i])
+            if day == current_date.day:
+                st.button(str(day), key=f"day_{day}", disabled=True)
+            else:
+                st.button(str(day), key=f"day_{day}")
+
+    # Days since delivery tracker
+    st.markdown("### Days since delivery")
+    st.markdown("## 42 days")
+    st.button("Update delivery date")
+
+    # New feature or tip
+    st.markdown(
+        """
+        <div style='background: linear-gradient(to right, #FFA07A, #DA70D6); padding: 10px; border-radius: 10px;'>
+            <h4 style='color: white; margin: 0;'>Tip of the day</h4>
+            <h3 style='color: white; margin: 0;'>Self-care is important!</h3>
+            <p style='color: white; margin: 0;'>Take 10 minutes for yourself today 💆‍♀️</p>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+
+    # Daily insights
+    st.markdown("### My daily check-in")
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.markdown(
+            """
+            <div style='background-color: #f0f0f0; padding: 10px; border-radius: 10px;'>
+                <h4 style='color: #FF69B4; style: 'margin: 0;'>Log your symptoms</h4>
+                <h1 style='color: #FF69B4; font-size: 48px; margin: 0;'>+</h1>
+            </div>
+            """,
+            unsafe_allow_html=True
+        )
+
+    with col2:
+        st.markdown(
+            """
+            <div style='background-color: #FFB6C1; padding: 10px; border-radius: 10px;'>
+                <p style='margin: 0;'>Your weekly screening is due. Click here to take it.</p>
+            </div>
+            """,
+            unsafe_allow_html=True
+        )
+
+    # Log symptoms (hidden by default, can be expanded)
+    with st.expander("Log your daily check-in"):
+        # Mental Health
+        st.subheader("Mental Health")
+        mental_health = st.select_slider(
+            "How have you been feeling about your mental health today?",
+            options=["Need support", "Some struggles", "Feeling good"]
+        )
+        st.text_area("Add any details about your mental health:")
+
+        # Stress Levels
+        st.subheader("Stress Levels")
+        stress = st.select_slider(
+            "Have you experienced any significant stressors today?",
+            options=["Low stress", "Moderate stress", "High stress"]
+        )
+        st.text_area("Add any details about your stress:")
+
+        # Social Support
+        st.subheader("Social Support")
+        social_support = st.slider("How supported do you feel by friends and family today? (1-5)", 1, 5)
+
+        # Physical Health
+        st.subheader("Physical Health")
+        physical_health = st.select_slider(
+            "How has your physical health been today?",
+            options=["Need to see a doctor", "Some concerns", "Feeling healthy"]
+        )
+
+        # Nutrition
+        st.subheader("Nutrition")
+        nutrition = st.slider("How balanced were your meals today? (1-5)", 1, 5)
+        st.text_area("Add any details about your nutrition:")
+
+        # Sleep Quality
+        st.subheader("Sleep Quality")
+        sleep_hours = st.slider("How many hours of sleep did you get last night?", 0, 12)
+        sleep_quality = st.slider("How would you rate your sleep quality? (1-5)", 1, 5)
+
+        # Economic Stress
+        st.subheader("Economic Stress")
+        economic_stress = st.slider("How are you feeling about your financial situation today? (1-5)", 1, 5)
+
+        # Hormonal Changes
+        st.subheader("Hormonal Changes")
+        hormonal_changes = st.selectbox(
+            "Have you noticed any mood or physical changes that might be hormonal?",
+            ["No", "Yes"]
+        )
+        if hormonal_changes == "Yes":
+            st.text_area("Please describe the changes:")
+
+        # Log Data
+        if st.button("Log Today's Data"):
+            st.success("Your data has been logged for today!")
+
+    # Aggregate responses for calculation
+    responses = {
+        "mental_health": MENTAL_HEALTH_SCORES[mental_health],
+        "stress_level": STRESS_SCORES[stress],
+        "social_support": (6 - social_support) * 2,  # Invert scale to reflect lack of support as higher risk
+        "physical_health": PHYSICAL_HEALTH_SCORES[physical_health],
+        "nutrition": (6 - nutrition) * 2,  # Invert scale to reflect poor nutrition as higher risk
+        "sleep_quality": (6 - sleep_quality) * 2,  # Invert scale for poor sleep quality as higher risk
+        "economic_stress": economic_stress * 2,  # Direct score for economic stress
+        "hormonal_changes": HORMONAL_CHANGES_SCORES[hormonal_changes]
+    }
+
+    # Weekly Screening
+    st.markdown("### Weekly Screening")
+    st.subheader("Edinburgh Postnatal Depression Scale (EPDS)")
+
+    epds_screening(responses)
+
+
+# Answering an EPDS question reruns only this fragment: the questionnaire and the
+# risk analyzer that depends on it. The check-in responses come from the last full run.
+@st.fragment
+@run_timing.timed("Home: EPDS screening fragment")
+def epds_screening(responses):
+    answers = []
+    for i, (question, options) in enumerate(zip(EPDS_QUESTIONS, EPDS_OPTIONS)):
+        answer = st.radio(question, options, key=f"epds_{i}")
+        answers.append(options.index(answer))
+    epds_score = score_epds(answers)
+
+    st.subheader(f"Your EPDS Score: {epds_score}")
+
+    if epds_score <= 9:
+        st.success("Your score indicates a low risk for postpartum depression.")
+    elif 10 <= epds_score <= 12:
+        st.warning("Your score indicates a possible risk for postpartum depression. Consider discussing this with your healthcare provider.")
+    else:
+        st.error("Your score indicates a high risk for postpartum depression. We strongly recommend contacting your healthcare provider for further evaluation and support.")
+
+    # Calculate Risk Logic
+    st.header("Risk Score Analyzer")
+
+    # Calculate overall risk score based on the weighted factors
+    weighted_risk_score = calculate_weighted_score(responses, WEIGHTS)
+
+    # Final risk score adjustment by combining EPDS score and weighted risk score
+    total_risk_score = epds_score + weighted_risk_score
+
+    # Display personalized risk score
+    st.subheader("Your Personalized Risk Score")
+    st.write(f"EPDS Score: {epds_score}")
+    st.write(f"Weighted Risk Score (from daily check-in factors): {weighted_risk_score:.2f}")
+    st.write(f"Total Risk Score: {total_risk_score:.2f}")
+
+        # Explanation of Risk Scores
+    st.markdown("""
+    ### Understanding Your Risk Scores
+
+    - **EPDS Score**: This score is derived from the Edinburgh Postnatal Depression Scale, which assesses the risk of postpartum depression.
+        - **0-9**: Low risk for postpartum depression
+        - **10-12**: Possible risk; consider discussing this with your healthcare provider
+        - **13 or higher**: High risk; strong recommendation to contact your healthcare provider for further evaluation
+
+    - **Personalized Risk Score**: Your total risk score combines your EPDS score and your daily logged answers, providing a comprehensive view of your well-being. The maximum possible score is **40**. 
+
+        - **0-10**: Low overall risk; generally managing well
+        - **11-20**: Moderate risk; some areas may need attention
+        - **21-30**: High risk; consider reaching out for additional support
+        - **31-40**: Very high risk; immediate professional assistance is advised
+
+    This personalized score helps you and your healthcare provider identify areas where you may need extra support and track your mental health over time.
+    """)
+
+    # Display personalized risk score
+    st.subheader("Your Personalized Risk Score")
+    
+    # Interpretation of the risk score based on thresholds
+    band = risk_band(total_risk_score)
+    if band == "low":
+        st.success("Low risk for postpartum depression.")
+    elif band == "mild":
+        st.warning("Mild risk for postpartum depression. Consider consulting a physician.")
+    elif band == "moderate":
+        st.warning("Moderate risk for postpartum depression. Professional support is advised.")
+    else:
+        st.error("High risk for postpartum depression. Seek immediate medical attention.")
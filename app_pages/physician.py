@@ -0,0 +1,56 @@
+# app_pages/physician.py
+import requests
+import streamlit as st
+from app_pages.trends import get_api_client, load_trends
+
+
+# The patient's rolling metrics from /summary/<patient_id>, using the API token
+# entered in the sidebar (rendered further down the page by load_trends)
+def load_summary(patient_id):
+    api_token = st.session_state.get("api_token")
+    if not api_token:
+        st.info("Enter an API token in the sidebar to see this patient's metrics.")
+        return None
+    try:
+        return get_api_client().summary(api_token, patient_id)
+    except requests.RequestException:
+        st.error("Could not load this patient's metrics from the server.")
+        return None
+
+
+def metric(value, unit=""):
+    return "No data" if value is None else f"{value:.1f}{unit}" if isinstance(value, float) else f"{value}{unit}"
+
+
+def render():
+    st.title("Physician's Page - Monitor Patients")
+
+    patient_id = st.number_input("Patient ID", min_value=1, step=1)
+
+    st.subheader("Key Patient Metrics")
+
+    # Display summary metrics for physician review
+    summary = load_summary(int(patient_id))
+    if summary is not None:
+        st.write(f"Latest EPDS Score: {metric(summary['latest_epds_score'])}")
+        st.write(f"Logs This Week: {summary['log_count_7d']}")
+        st.write(f"Average Sleep This Week: {metric(summary['avg_sleep_hours_7d'], ' hours')}")
+        st.write(f"Average Sleep Quality: {metric(summary['avg_sleep_quality_7d'], '/5')}")
+        st.write(f"Average Stress Level: {metric(summary['avg_stress_level_7d'], '/10')}")
+
+    # Show patient's trends
+    st.subheader("Patient's Data Trends")
+    st.line_chart(load_trends(int(patient_id)).set_index("Date"))
+    
+    # Example: Send feedback to patient
+    st.subheader("Send Feedback to Patient")
+    feedback = st.text_area("Enter your feedback here:")
+    if st.button("Send Feedback"):
+        st.success("Feedback sent to the patient.")
+
+    # Appointment Scheduling
+    st.subheader("Schedule Appointment")
+    appointment_date = st.date_input("Select appointment date")
+    appointment_time = st.time_input("Select appointment time")
+    if st.button("Schedule Appointment"):
+        st.success(f"Appointment scheduled for {appointment_date} at {appointment_time}")
@@ -0,0 +1,21 @@
+# app_pages/profile.py
+import streamlit as st
+
+
+def render():
+    st.title("User Profile")
+
+    # Example profile info (could be retrieved from a database in a real app)
+    st.subheader("User Information")
+    st.write("Name: Jane Doe")
+    st.write("Age: 32")
+    st.write("Weeks Postpartum: 6")
+    st.write("Email: janedoe@example.com")
+
+    # Update Profile Info
+    st.subheader("Update Your Profile")
+    new_name = st.text_input("Name", value="Jane Doe")
+    new_email = st.text_input("Email", value="janedoe@example.com")
+    new_weeks_postpartum = st.number_input("Weeks Postpartum", value=6, min_value=0)
+    if st.button("Update Profile"):
+        st.success("Your profile has been updated!")
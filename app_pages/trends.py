@@ -0,0 +1,55 @@
+# app_pages/trends.py
+import streamlit as st
+import pandas as pd
+import numpy as np
+import requests
+from api_client import ApiDataClient
+
+
+# Sample data for trend analysis, generated once instead of on every rerun
+@st.cache_data
+def sample_trends():
+    sample_data = {
+        "Date": pd.date_range(start="2024-09-01", periods=7, freq="D"),
+        "Mental Health Score": np.random.randint(1, 10, 7),
+        "Stress Score": np.random.randint(1, 10, 7),
+        "Social Support Score": np.random.randint(1, 5, 7),
+        "Physical Health Score": np.random.randint(1, 10, 7),
+        "Nutrition Score": np.random.randint(1, 5, 7),
+        "Sleep Score": np.random.randint(1, 5, 7),
+        "EPDS Score": np.random.randint(7, 19, 7),
+    }
+
+    # Convert sample data to DataFrame
+    return pd.DataFrame(sample_data)
+
+
+# Shared across reruns and sessions so HTTP connections and fetched rows are reused
+@st.cache_resource
+def get_api_client():
+    return ApiDataClient()
+
+
+# Bucketed trends from the API when signed in (a patient's own, or `user_id` for
+# physicians), sample data otherwise
+def load_trends(user_id=None):
+    api_token = st.sidebar.text_input("API token", type="password", key="api_token")
+    resolution = st.sidebar.radio("Resolution", ["day", "week", "month"], horizontal=True)
+    if api_token:
+        try:
+            return get_api_client().trends(api_token, resolution, user_id)
+        except requests.RequestException:
+            st.error("Could not load data from the server. Showing sample data instead.")
+    return sample_trends()
+
+
+def render():
+    st.title("Trends - View Historical Data")
+
+    trend_df = load_trends()
+
+    # Plot historical data for mental health and other metrics
+    st.line_chart(trend_df.set_index("Date"))
+
+    st.subheader("Historical Data Overview")
+    st.write(trend_df)
@@ -0,0 +1,74 @@
+# benchmarks/bench_serializers.py
+# Rows per second for the /daily_log, /epds and /messages read paths: the old
+# ORM + per-row column reflection serialization versus the precompiled
+# RowSerializer over Core select() tuples.
+#
+#   $ python benchmarks/bench_serializers.py [rows]
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+DB_DIR = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(DB_DIR, 'bench.db')
+
+from app import (app, db, User, DailyLog, EPDSScore, Message,  # noqa: E402
+                 daily_log_serializer, epds_score_serializer, message_serializer)
+
+
+def populate(rows):
+    db.session.add_all([User(id=1, username='mother', email='mother@example.com'),
+                        User(id=2, username='physician', email='physician@example.com', is_physician=True)])
+    start = date(2024, 1, 1)
+    db.session.execute(DailyLog.__table__.insert(), [
+        {'user_id': 1, 'date': start + timedelta(days=i % 365), 'mental_health': 6, 'stress_level': 3,
+         'social_support': 4, 'physical_health': 3, 'nutrition': 3, 'sleep_hours': 6.5, 'sleep_quality': 3,
+         'economic_stress': 2, 'hormonal_changes': False, 'notes': 'Slept a little better today'}
+        for i in range(rows)])
+    db.session.execute(EPDSScore.__table__.insert(), [
+        {'user_id': 1, 'date': start + timedelta(days=i % 365), 'score': i % 30} for i in range(rows)])
+    db.session.execute(Message.__table__.insert(), [
+        {'sender_id': 1 + i % 2, 'receiver_id': 2 - i % 2, 'content': 'How are you feeling today?',
+         'timestamp': datetime(2024, 1, 1) + timedelta(minutes=i)} for i in range(rows)])
+    db.session.commit()
+
+
+def orm_path(model, criteria):
+    rows = model.query.filter(criteria).all()
+    return [app.json.dumps({column.name: getattr(row, column.name) for column in row.__table__.columns}) for row in rows]
+
+
+def serializer_path(serializer, criteria):
+    result = db.session.execute(serializer.select().where(criteria))
+    return [serializer.to_json(row) for row in result]
+
+
+def rows_per_second(function, *args):
+    db.session.remove()
+    started = time.perf_counter()
+    count = len(function(*args))
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    with app.app_context():
+        db.create_all()
+        populate(rows)
+        endpoints = [
+            ('/daily_log', DailyLog, daily_log_serializer, DailyLog.user_id == 1),
+            ('/epds', EPDSScore, epds_score_serializer, EPDSScore.user_id == 1),
+            ('/messages', Message, message_serializer, (Message.sender_id == 1) | (Message.receiver_id == 1)),
+        ]
+        print(f'{"endpoint":<12}{"before rows/s":>16}{"after rows/s":>16}{"speedup":>10}')
+        for name, model, serializer, criteria in endpoints:
+            before = rows_per_second(orm_path, model, criteria)
+            after = rows_per_second(serializer_path, serializer, criteria)
+            print(f'{name:<12}{before:>16,.0f}{after:>16,.0f}{after / before:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,406 @@
+# benchmarks/run_benchmarks.py
+# Offline load and micro-benchmark suite. Builds a synthetic population in a
+# temporary SQLite database, drives every API route through the Flask test
+# client from concurrent workers, times the EPDS and weighted-risk scoring
+# code, and compares median latency and throughput against baselines recorded
+# on the same machine.
+# The SSE streams (/messages/stream, /alerts/stream) are left out on purpose:
+# they stay open until the client leaves, so they have no latency to time.
+#
+#   $ python benchmarks/run_benchmarks.py --profile small
+#   $ python benchmarks/run_benchmarks.py --profile full --update-baseline
+#   $ python benchmarks/run_benchmarks.py --profile small --shards 4
+#
+# Timings only compare on the hardware that produced them, so baselines are not
+# kept in git. The first run of a profile on a machine records its baseline in
+# benchmarks/baselines.json (unless a route returned errors); later runs exit
+# with status 1 when any result regresses past --tolerance, has more error
+# responses than its baseline, or has no baseline.
+import argparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = {
+    'small': {'users': 500, 'logs': 20000, 'requests': 200, 'hash_requests': 16},
+    'full': {'users': 10000, 'logs': 1000000, 'requests': 2000, 'hash_requests': 64},
+}
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+
+class Context:
+    def __init__(self, app, patients, physicians, seed):
+        import jwt
+        self.app = app
+        self.patients = patients
+        self.physicians = physicians
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.usernames = itertools.count()
+        self.etags = {}
+        self.alerts = None
+        expires = datetime.utcnow() + timedelta(hours=24)
+        self.tokens = {user_id: jwt.encode({'user_id': user_id, 'exp': expires}, app.config['SECRET_KEY'], algorithm='HS256')
+                       for user_id in patients + physicians}
+
+    def patient(self):
+        with self.lock:
+            return self.rng.choice(self.patients)
+
+    def physician(self):
+        with self.lock:
+            return self.rng.choice(self.physicians)
+
+    # A patient and the physician they are assigned to, who may read their data
+    def patient_with_physician(self):
+        from synthetic import physician_of
+        patient = self.patient()
+        return patient, physician_of(patient, len(self.patients), len(self.physicians))
+
+    # `count` patients assigned to `physician`
+    def patients_of(self, physician, count):
+        assigned = self.patients[self.physicians.index(physician)::len(self.physicians)]
+        with self.lock:
+            return [self.rng.choice(assigned) for _ in range(count)]
+
+    def auth(self, user_id):
+        return {'Authorization': self.tokens[user_id]}
+
+    # ETag of a patient's GET `path`, fetched on first use (outside the timed request)
+    def etag(self, user_id, path):
+        with self.lock:
+            etag = self.etags.get((user_id, path))
+        if etag is None:
+            etag = self.app.test_client().get(path, headers=self.auth(user_id)).headers['ETag']
+            with self.lock:
+                self.etags[(user_id, path)] = etag
+        return etag
+
+    # An alert id and a physician allowed to acknowledge it. Alerts are raised in the
+    # background by the write scenarios, so they are listed on first use.
+    def alert(self):
+        from app import Alert, db
+        with self.lock:
+            if self.alerts is None:
+                with self.app.app_context():
+                    self.alerts = db.session.execute(db.select(Alert.id, Alert.physician_id)).all()
+                    db.session.remove()
+            alert_id, physician_id = self.rng.choice(self.alerts)
+            return alert_id, physician_id if physician_id is not None else self.rng.choice(self.physicians)
+
+
+def check_in():
+    return {'mental_health': random.choice((3, 6, 10)), 'stress_level': random.choice((3, 6, 10)),
+            'social_support': random.randint(1, 5), 'physical_health': random.choice((3, 6, 10)),
+            'nutrition': random.randint(1, 5), 'sleep_hours': round(random.uniform(3, 9), 1),
+            'sleep_quality': random.randint(1, 5), 'economic_stress': random.randint(1, 5),
+            'hormonal_changes': random.random() < 0.3, 'notes': 'Synthetic check-in'}
+
+
+def sync_body():
+    lines = []
+    for day in range(10):
+        record_date = (datetime.utcnow() - timedelta(days=day)).date().isoformat()
+        lines.append(json.dumps({'type': 'daily_log', 'date': record_date, **check_in()}))
+        if day % 7 == 0:
+            lines.append(json.dumps({'type': 'epds', 'date': record_date, 'score': random.randint(0, 30)}))
+    return '\n'.join(lines)
+
+
+# Each scenario builds one request: (method, path, keyword arguments for client.open)
+def scenarios(ctx):
+    def patient_request(method, path, **kwargs):
+        def build():
+            return method, path, {'headers': ctx.auth(ctx.patient()), **kwargs}
+        return build
+
+    def physician_request(method, path):
+        def build():
+            return method, path, {'headers': ctx.auth(ctx.physician())}
+        return build
+
+    def export_request(query):
+        def build():
+            physician = ctx.physician()
+            user_ids = ','.join(str(patient) for patient in ctx.patients_of(physician, 10))
+            return 'GET', f'/export?{query}&user_ids={user_ids}', {'headers': ctx.auth(physician)}
+        return build
+
+    def register():
+        name = f'bench{next(ctx.usernames)}'
+        return 'POST', '/register', {'json': {'username': name, 'email': f'{name}@example.com', 'password': 'password'}}
+
+    def login():
+        return 'POST', '/login', {'json': {'username': f'user{ctx.patient()}', 'password': 'password'}}
+
+    def daily_log_post():
+        return 'POST', '/daily_log', {'headers': ctx.auth(ctx.patient()), 'json': check_in()}
+
+    def epds_post():
+        return 'POST', '/epds', {'headers': ctx.auth(ctx.patient()),
+                                 'json': {'answers': [random.randint(0, 3) for _ in range(10)]}}
+
+    def sync():
+        return 'POST', '/sync', {'headers': ctx.auth(ctx.patient()), 'data': sync_body(),
+                                 'content_type': 'application/x-ndjson'}
+
+    def message_post():
+        patient = ctx.patient()
+        return 'POST', '/message', {'headers': ctx.auth(patient),
+                                    'json': {'receiver_id': ctx.physician(), 'content': 'Synthetic message'}}
+
+    def risk_batch():
+        rows = [{**check_in(), 'epds_score': random.randint(0, 30)} for _ in range(100)]
+        return 'POST', '/risk/batch', {'headers': ctx.auth(ctx.patient()), 'json': {'rows': rows}}
+
+    def revalidate(path):
+        def build():
+            patient = ctx.patient()
+            return 'GET', path, {'headers': {**ctx.auth(patient), 'If-None-Match': ctx.etag(patient, path)}}
+        return build
+
+    def profile_put():
+        return 'PUT', '/profile', {'headers': ctx.auth(ctx.patient()), 'json': {'weeks_postpartum': random.randint(1, 52)}}
+
+    def alert_acknowledge():
+        alert_id, physician = ctx.alert()
+        return 'POST', f'/alerts/{alert_id}/acknowledge', {'headers': ctx.auth(physician)}
+
+    def patient_summary():
+        patient, physician = ctx.patient_with_physician()
+        return 'GET', f'/summary/{patient}', {'headers': ctx.auth(physician)}
+
+    def physician_panel():
+        return 'GET', '/physician/patients?top_k=50', {'headers': ctx.auth(ctx.physician())}
+
+    def search_patient():
+        query = random.choice(('crying', "can't sleep", 'walk friend', 'better'))
+        patient, physician = ctx.patient_with_physician()
+        return 'GET', '/search', {'headers': ctx.auth(physician), 'query_string': {'q': query, 'user_id': patient}}
+
+    def patient_trends():
+        patient, physician = ctx.patient_with_physician()
+        return 'GET', f'/trends/{patient}?resolution=month', {'headers': ctx.auth(physician)}
+
+    return [
+        ('POST /register', register, True),
+        ('POST /login', login, True),
+        ('POST /daily_log', daily_log_post, False),
+        ('GET /daily_log', patient_request('GET', '/daily_log?limit=100'), False),
+        ('GET /daily_log (full history)', patient_request('GET', '/daily_log'), False),
+        ('GET /daily_log (If-None-Match)', revalidate('/daily_log?limit=100'), False),
+        ('POST /epds', epds_post, False),
+        ('GET /epds', patient_request('GET', '/epds'), False),
+        ('GET /epds (If-None-Match)', revalidate('/epds'), False),
+        ('POST /sync', sync, False),
+        ('POST /message', message_post, False),
+        ('GET /messages', patient_request('GET', '/messages?limit=100'), False),
+        ('POST /risk/batch (100 rows)', risk_batch, False),
+        ('POST /risk/batch (history)', patient_request('POST', '/risk/batch', json={}), False),
+        ('GET /profile', patient_request('GET', '/profile'), False),
+        ('PUT /profile', profile_put, False),
+        ('GET /profile (If-None-Match)', revalidate('/profile'), False),
+        ('GET /summary', patient_request('GET', '/summary'), False),
+        ('GET /summary/<user_id>', patient_summary, False),
+        ('GET /physician/patients', physician_panel, False),
+        ('GET /physician/epds_items', physician_request('GET', '/physician/epds_items'), False),
+        ('GET /alerts', physician_request('GET', '/alerts?unacknowledged=1&limit=100'), False),
+        ('POST /alerts/<id>/acknowledge', alert_acknowledge, False),
+        ('GET /export (csv, 10 patients)', export_request('format=csv'), False),
+        ('GET /export (ndjson gzip, 10 patients)', export_request('format=ndjson&gzip=1'), False),
+        ('GET /search', search_patient, False),
+        ('GET /trends (day)', patient_request('GET', '/trends'), False),
+        ('GET /trends (week)', patient_request('GET', '/trends?resolution=week&metrics=mental_health,epds_score'), False),
+        ('GET /trends/<user_id> (month)', patient_trends, False),
+        ('GET /metrics/hashing', lambda: ('GET', '/metrics/hashing', {}), False),
+        ('GET /metrics', lambda: ('GET', '/metrics', {}), False),
+    ]
+
+
+def summarize(latencies, wall_seconds, count, errors=0):
+    import numpy as np
+    p50, p95, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 95, 99])
+    return {'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99),
+            'throughput': count / wall_seconds, 'errors': errors}
+
+
+# Send `count` requests from `workers` threads, each with its own test client
+def drive(app, build, count, workers):
+    local = threading.local()
+
+    def one(_):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        method, path, kwargs = build()
+        started = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        response.get_data()
+        return time.perf_counter() - started, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers) as executor:
+        results = list(executor.map(one, range(count)))
+    wall = time.perf_counter() - started
+    statuses = Counter(status for _, status in results)
+    errors = sum(n for status, n in statuses.items() if status >= 400)
+    return summarize([latency for latency, _ in results], wall, count, errors)
+
+
+# Time `batches` runs of `calls` calls each; latency is per call, throughput in calls per second
+def micro(function, calls, batches=30):
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(batches):
+        batch_started = time.perf_counter()
+        for _ in range(calls):
+            function()
+        latencies.append((time.perf_counter() - batch_started) / calls)
+    return summarize(latencies, time.perf_counter() - started, calls * batches)
+
+
+def micro_benchmarks():
+    import numpy as np
+    from calibration import History, calibrate, random_weights
+    from risk_scoring import (FACTORS, calculate_weighted_score, daily_log_factor_matrix, epds_item_distribution,
+                              flag_self_harm, score_batch, score_epds, score_packed_epds)
+    rng = np.random.default_rng(0)
+    answers = rng.integers(0, 4, size=10).tolist()
+    responses = {factor: float(score) for factor, score in zip(FACTORS, rng.integers(2, 11, size=len(FACTORS)))}
+    factor_scores = rng.integers(2, 11, size=(100000, len(FACTORS))).astype(np.float64)
+    epds = rng.integers(0, 31, size=100000)
+    rows = [check_in() for _ in range(10000)]
+    packed = rng.integers(0, 1 << 20, size=1000000)
+    history = History(factor_scores, epds, np.clip(epds + rng.integers(-5, 6, size=100000), 0, 30))
+    candidates = random_weights(256, seed=0)
+    return {
+        'score_epds (1 screening)': micro(lambda: score_epds(answers), 1000),
+        'calculate_weighted_score (1 patient)': micro(lambda: calculate_weighted_score(responses), 1000),
+        'score_batch (100k rows)': micro(lambda: score_batch(factor_scores, epds), 1, batches=20),
+        'daily_log_factor_matrix (10k rows)': micro(lambda: daily_log_factor_matrix(rows), 1, batches=10),
+        'score_packed_epds (1M screenings)': micro(lambda: score_packed_epds(packed), 1, batches=10),
+        'epds_item_distribution (1M screenings)': micro(lambda: epds_item_distribution(packed), 1, batches=10),
+        'flag_self_harm (1M screenings)': micro(lambda: flag_self_harm(packed), 1, batches=10),
+        'calibrate (256 candidates, 100k rows)': micro(lambda: calibrate(history, candidates, workers=1), 1, batches=5),
+    }
+
+
+# Regressions are judged on p50 latency and throughput; p95/p99 are reported but
+# swing with GIL and scheduler noise. Latency changes smaller than this are
+# ignored whatever the ratio.
+MIN_LATENCY_DELTA_MS = 5.0
+
+
+# A request can wait a GIL switch interval behind every other worker sharing its
+# CPU, so with more workers than CPUs p50 moves by that much between identical runs
+def latency_noise_ms(workers):
+    return max(MIN_LATENCY_DELTA_MS, sys.getswitchinterval() * 1000 * workers / (os.cpu_count() or 1))
+
+
+def regressions(results, baseline, tolerance, min_latency_delta_ms=MIN_LATENCY_DELTA_MS):
+    failures = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            failures.append(f'{name}: no baseline, record one with --update-baseline')
+            continue
+        if result['errors'] > base.get('errors', 0):
+            failures.append(f"{name}: {result['errors']} errors > baseline {base.get('errors', 0)}")
+        if (result['p50_ms'] > base['p50_ms'] * (1 + tolerance)
+                and result['p50_ms'] - base['p50_ms'] > min_latency_delta_ms):
+            failures.append(f"{name}: p50 {result['p50_ms']:.2f} ms > baseline {base['p50_ms']:.2f} ms")
+        if result['throughput'] < base['throughput'] * (1 - tolerance):
+            failures.append(f"{name}: throughput {result['throughput']:.1f}/s < baseline {base['throughput']:.1f}/s")
+    return failures
+
+
+def report(results):
+    print(f'{"benchmark":<40}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"ops/s":>12}{"errors":>8}')
+    for name, result in results.items():
+        print(f'{name:<40}{result["p50_ms"]:>10.3f}{result["p95_ms"]:>10.3f}{result["p99_ms"]:>10.3f}'
+              f'{result["throughput"]:>12.1f}{result["errors"]:>8}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--profile', choices=PROFILES, default='small')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.5)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--shards', type=int, default=0, help='run with SHARD_COUNT shards (baselined separately)')
+    args = parser.parse_args()
+    profile = PROFILES[args.profile]
+    baseline_key = f'{args.profile}-shards{args.shards}' if args.shards else args.profile
+
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['SHARD_COUNT'] = str(args.shards)
+    from app import app, User, DailyLog, EPDSScore, Message, create_tables, db, rebalance_shards, rebuild_summaries
+    from synthetic import populate
+    random.seed(args.seed)
+
+    with app.app_context():
+        create_tables()
+        started = time.perf_counter()
+        patients, physicians = populate(db, (User, DailyLog, EPDSScore, Message), profile['users'], profile['logs'],
+                                        seed=args.seed, password_method=app.config['PASSWORD_HASH_METHOD'])
+        # The population is written to the main database; sharded runs move it onto the shards
+        if args.shards:
+            rebalance_shards()
+        else:
+            rebuild_summaries()
+        print(f'Generated {profile["users"]} users and {profile["logs"]} logs in {time.perf_counter() - started:.1f}s')
+    ctx = Context(app, patients, physicians, args.seed)
+
+    # More concurrent hashes than PASSWORD_HASH_MAX_PENDING are rejected with 503,
+    # so /register and /login are driven at most that wide
+    hash_workers = min(args.workers, app.config['PASSWORD_HASH_MAX_PENDING'])
+    results = {}
+    for name, build, hashes_password in scenarios(ctx):
+        count = profile['hash_requests'] if hashes_password else profile['requests']
+        workers = hash_workers if hashes_password else args.workers
+        # Best of --repeat runs, so one noisy run neither sets nor trips a baseline
+        runs = [drive(app, build, count, workers) for _ in range(args.repeat)]
+        results[name] = min(runs, key=lambda run: run['p50_ms'])
+    results.update(micro_benchmarks())
+    report(results)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    if not args.update_baseline and baseline_key not in baselines:
+        failures = [f"{name}: {result['errors']} errors" for name, result in results.items() if result['errors']]
+        for failure in failures:
+            print(f'ERRORS {failure}')
+        if failures:
+            sys.exit(1)
+    if args.update_baseline or baseline_key not in baselines:
+        baselines[baseline_key] = results
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f'Baseline for {baseline_key!r} written to {args.baseline}; later runs on this machine are compared with it')
+        return
+    failures = regressions(results, baselines.get(baseline_key, {}), args.tolerance, latency_noise_ms(args.workers))
+    for failure in failures:
+        print(f'REGRESSION {failure}')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
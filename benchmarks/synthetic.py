@@ -0,0 +1,98 @@
+# benchmarks/synthetic.py
+# Synthetic patient population for load tests: patients with a daily check-in
+# history since delivery, weekly item-level EPDS screenings, and message
+# threads with their physician. Rows are written with executemany in chunks.
+from datetime import date, datetime, timedelta
+import random
+
+from werkzeug.security import generate_password_hash
+
+from risk_scoring import EPDS_ITEM_COUNT, EPDS_NORMAL_ITEMS, pack_epds, score_epds
+
+PASSWORD = 'password'
+PATIENTS_PER_PHYSICIAN = 100
+CHUNK_SIZE = 20000
+NOTES = (
+    None, None, None,
+    'Slept a little better today',
+    "Baby was up all night, can't sleep",
+    'Feeling overwhelmed and crying a lot',
+    'Went for a walk with a friend',
+    'Back pain is getting better',
+)
+
+
+# Patients 1..patients are spread round-robin over the physicians that follow them
+def physician_of(patient_id, patients, physicians):
+    return patients + 1 + (patient_id - 1) % physicians
+
+
+def _insert(db, table, rows):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(table.insert(), rows[start:start + CHUNK_SIZE])
+
+
+# Fill User, DailyLog, EPDSScore and Message for `users` users and about `logs`
+# daily logs overall. Returns the patient and physician ids.
+def populate(db, models, users=10000, logs=1000000, messages_per_patient=10, seed=42, today=None,
+             password_method='scrypt:32768:8:1'):
+    User, DailyLog, EPDSScore, Message = models
+    rng = random.Random(seed)
+    today = today or date.today()
+    password_hash = generate_password_hash(PASSWORD, password_method)
+    physicians = max(1, users // (PATIENTS_PER_PHYSICIAN + 1))
+    patients = users - physicians
+
+    user_rows = []
+    for user_id in range(1, users + 1):
+        is_physician = user_id > patients
+        weeks = None if is_physician else rng.randint(1, 52)
+        user_rows.append({
+            'id': user_id, 'username': f'user{user_id}', 'email': f'user{user_id}@example.com',
+            'password_hash': password_hash, 'is_physician': is_physician, 'weeks_postpartum': weeks,
+            'physician_id': None if is_physician else physician_of(user_id, patients, physicians),
+            'delivery_date': None if is_physician else datetime.combine(today - timedelta(weeks=weeks), datetime.min.time()),
+        })
+    # Physicians first, so patients' physician_id references already exist
+    _insert(db, User.__table__, user_rows[patients:] + user_rows[:patients])
+
+    logs_per_patient = max(1, logs // max(patients, 1))
+    log_rows, score_rows, message_rows = [], [], []
+    for patient_id in range(1, patients + 1):
+        physician_id = physician_of(patient_id, patients, physicians)
+        # Everyone starts somewhere on a slow recovery curve
+        baseline = rng.uniform(0.2, 0.8)
+        for day in range(logs_per_patient):
+            log_date = today - timedelta(days=logs_per_patient - day)
+            mood = min(1.0, max(0.0, baseline + rng.gauss(0, 0.15) - day / (logs_per_patient * 4)))
+            log_rows.append({
+                'user_id': patient_id, 'date': log_date,
+                'mental_health': (3, 6, 10)[min(2, int(mood * 3))],
+                'stress_level': (3, 6, 10)[rng.randint(0, 2)],
+                'social_support': rng.randint(1, 5),
+                'physical_health': (3, 6, 10)[rng.randint(0, 2)],
+                'nutrition': rng.randint(1, 5),
+                'sleep_hours': round(rng.uniform(3, 9), 1),
+                'sleep_quality': rng.randint(1, 5),
+                'economic_stress': rng.randint(1, 5),
+                'hormonal_changes': rng.random() < 0.3,
+                'notes': rng.choice(NOTES),
+            })
+            if day % 7 == 0:
+                item_scores = [min(3, max(0, round(rng.gauss(mood * 2, 0.7)))) for _ in range(EPDS_ITEM_COUNT)]
+                answers = [score if item in EPDS_NORMAL_ITEMS else 3 - score for item, score in enumerate(item_scores)]
+                score_rows.append({'user_id': patient_id, 'date': log_date, 'score': score_epds(answers),
+                                   'answers': pack_epds(answers)})
+        for i in range(messages_per_patient):
+            sender, receiver = (patient_id, physician_id) if i % 2 == 0 else (physician_id, patient_id)
+            message_rows.append({'sender_id': sender, 'receiver_id': receiver,
+                                 'content': rng.choice(NOTES[3:]) or 'How are you feeling today?',
+                                 'timestamp': datetime.combine(today, datetime.min.time()) - timedelta(hours=messages_per_patient - i)})
+        if len(log_rows) >= CHUNK_SIZE:
+            _insert(db, DailyLog.__table__, log_rows)
+            log_rows = []
+    _insert(db, DailyLog.__table__, log_rows)
+    _insert(db, EPDSScore.__table__, score_rows)
+    _insert(db, Message.__table__, message_rows)
+    db.session.commit()
+    return list(range(1, patients + 1)), list(range(patients + 1, users + 1))
@@ -1,23 +1,6 @@
 import streamlit as st
-
-# Define the weights for each factor
-weights = {
-    "mental_health_history": 0.25,
-    "current_stress": 0.15,
-    "social_support": 0.20,
-    "physical_health": 0.10,
-    "nutrition": 0.10,
-    "sleep_quality": 0.10,
-    "economic_stress": 0.05,
-    "hormonal_changes": 0.05
-}
-
-# Function to calculate weighted score
-def calculate_weighted_score(responses, weights):
-    total_score = 0
-    for factor, score in responses.items():
-        total_score += score * weights[factor]
-    return total_score
+from risk_model import (WEIGHTS, MENTAL_HEALTH_SCORES, STRESS_SCORES, PHYSICAL_HEALTH_SCORES,
+                        HORMONAL_CHANGES_SCORES, calculate_weighted_score, risk_band)
 
 # App title
 st.title("Personalized Postpartum Depression Risk Analyzer")
@@ -34,14 +17,14 @@ mental_health_history = st.selectbox(
     "How have you been feeling about your mental health lately?",
     ["Feeling good", "Some struggles", "Need support"]
 )
-mental_health_score = {"Feeling good": 3, "Some struggles": 6, "Need support": 10}[mental_health_history]
+mental_health_score = MENTAL_HEALTH_SCORES[mental_health_history]
 
 # 2. Current Stress Levels
 current_stress = st.selectbox(
     "How are you managing stressors recently?",
     ["Low stress", "Moderate stress", "High stress"]
 )
-current_stress_score = {"Low stress": 3, "Moderate stress": 6, "High stress": 10}[current_stress]
+current_stress_score = STRESS_SCORES[current_stress]
 
 # 3. Perception of Social Support
 social_support = st.slider("How supported do you feel by friends and family (1-5)?", 1, 5, 3)
@@ -52,7 +35,7 @@ physical_health = st.selectbox(
     "How has your physical health been lately?",
     ["Feeling healthy", "Some concerns", "Need to see a doctor"]
 )
-physical_health_score = {"Feeling healthy": 3, "Some concerns": 6, "Need to see a doctor": 10}[physical_health]
+physical_health_score = PHYSICAL_HEALTH_SCORES[physical_health]
 
 # 5. Nutrition Check-In
 nutrition = st.slider("How balanced were your meals this week (1-5)?", 1, 5, 3)
@@ -72,12 +55,12 @@ hormonal_changes = st.selectbox(
     "Have you noticed any mood or physical changes due to hormones?",
     ["No", "Yes"]
 )
-hormonal_changes_score = {"No": 3, "Yes": 10}[hormonal_changes]
+hormonal_changes_score = HORMONAL_CHANGES_SCORES[hormonal_changes]
 
 # Aggregate responses for calculation
 responses = {
-    "mental_health_history": mental_health_score,
-    "current_stress": current_stress_score,
+    "mental_health": mental_health_score,
+    "stress_level": current_stress_score,
     "social_support": social_support_score,
     "physical_health": physical_health_score,
     "nutrition": nutrition_score,
@@ -87,7 +70,7 @@ responses = {
 }
 
 # Calculate overall risk score based on the weighted factors
-weighted_risk_score = calculate_weighted_score(responses, weights)
+weighted_risk_score = calculate_weighted_score(responses, WEIGHTS)
 
 # Final risk score adjustment by combining EPDS score and weighted risk score
 total_risk_score = epds_score + weighted_risk_score
@@ -99,11 +82,12 @@ st.write(f"Weighted Risk Score (from additional factors): {weighted_risk_score:.
 st.write(f"Total Risk Score: {total_risk_score:.2f}")
 
 # Interpretation of the risk score based on EPDS thresholds
-if total_risk_score <= 6:
+band = risk_band(total_risk_score)
+if band == "low":
     st.success("Low risk for postpartum depression.")
-elif 7 <= total_risk_score <= 13:
+elif band == "mild":
     st.warning("Mild risk for postpartum depression. Consider consulting a physician.")
-elif 14 <= total_risk_score <= 19:
+elif band == "moderate":
     st.warning("Moderate risk for postpartum depression. Professional support is advised.")
 else:
     st.error("High risk for postpartum depression. Seek immediate medical attention.")
@@ -0,0 +1,295 @@
+# calibration.py
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+
+import numpy as np
+
+from risk_scoring import FACTORS, RISK_BAND_NAMES
+
+# Follow-up EPDS scores the band cut-offs are fitted to predict: a total above
+# the mild, moderate and high cut-offs should mean a follow-up EPDS of at least
+# 7 (above the "none" range), 10 (possible) and 13 (probable depression)
+OUTCOME_LEVELS = (7, 10, 13)
+# A daily log's outcome is the patient's first screening within this many days after it
+FOLLOW_UP_DAYS = 28
+# Cut-offs are searched on a grid of this step up to the highest possible total
+THRESHOLD_STEP = 0.25
+MAX_TOTAL_RISK_SCORE = 40
+# Candidates per process pool task, and elements of the (rows, candidates)
+# score matrix computed at once
+CANDIDATE_BATCH = 256
+MAX_BLOCK = 4 * 1024 * 1024
+# Runs of rows sharing a count are tallied without weights when at least this long
+MIN_RUN_ROWS = 4096
+# In grid units; see GridScorer
+TIE_UNITS = 1e-4
+
+
+# Pair every daily log with its patient's latest screening on or before the log
+# date (0 without one, like GET /risk/batch) and the first screening within
+# follow_up_days after it. Logs are (user id, day number) arrays, screenings
+# (user id, day number, EPDS total). Returns the current EPDS, the follow-up
+# EPDS and a mask of the logs that have a follow-up.
+def pair_follow_ups(log_users, log_days, screen_users, screen_days, screen_scores, follow_up_days=FOLLOW_UP_DAYS):
+    current = np.zeros(len(log_users), dtype=np.float64)
+    follow_up = np.zeros(len(log_users), dtype=np.float64)
+    if not len(log_users) or not len(screen_users):
+        return current, follow_up, np.zeros(len(log_users), dtype=bool)
+    # Stable, so same-day screenings keep their id order and the last one is the latest
+    order = np.lexsort((screen_days, screen_users))
+    screen_users, screen_days, screen_scores = screen_users[order], screen_days[order], screen_scores[order]
+    # Offset each patient's day numbers so one sorted search covers every patient
+    first_day = min(log_days.min(), screen_days.min())
+    span = max(log_days.max(), screen_days.max()) - first_day + follow_up_days + 2
+    screen_keys = screen_users * span + (screen_days - first_day)
+    log_keys = log_users * span + (log_days - first_day)
+    after = np.searchsorted(screen_keys, log_keys, side='right')
+
+    before = np.maximum(after - 1, 0)
+    has_current = (after > 0) & (screen_users[before] == log_users)
+    current[has_current] = screen_scores[before[has_current]]
+
+    after = np.minimum(after, len(screen_keys) - 1)
+    has_follow_up = ((screen_users[after] == log_users) & (screen_days[after] > log_days)
+                     & (screen_days[after] - log_days <= follow_up_days))
+    follow_up[has_follow_up] = screen_scores[after[has_follow_up]]
+    return current, follow_up, has_follow_up
+
+
+# Paired history as the distinct (factor scores, current EPDS, outcome class)
+# rows and how often each occurs. Answers and EPDS totals take few values, so
+# millions of logs collapse into a smaller table scored against every
+# candidate. A row's class is the number of outcome levels its follow-up
+# reached. Rows are ordered by count, so runs of equal counts can be tallied
+# without per-row weights.
+class History:
+    def __init__(self, factor_scores, current_epds, follow_up_epds, outcome_levels=OUTCOME_LEVELS):
+        classes = np.searchsorted(np.asarray(outcome_levels), follow_up_epds, side='right')
+        rows = np.ascontiguousarray(np.column_stack([factor_scores, current_epds, classes]), dtype=np.float64)
+        # Comparing rows as raw bytes is much faster than np.unique(axis=0)
+        _, first, counts = np.unique(rows.view(np.dtype((np.void, rows.itemsize * rows.shape[1]))).ravel(),
+                                     return_index=True, return_counts=True)
+        order = np.argsort(counts, kind='stable')
+        unique = rows[first[order]]
+        self.factor_scores = unique[:, :len(FACTORS)]
+        self.epds = unique[:, len(FACTORS)]
+        self.classes = unique[:, -1].astype(np.int64)
+        self.counts = counts[order].astype(np.float64)
+        self.outcome_levels = tuple(outcome_levels)
+        self.rows = len(follow_up_epds)
+
+    # Logs whose follow-up reached each outcome level
+    def positives(self):
+        return [int(self.counts[self.classes > level].sum()) for level in range(len(self.outcome_levels))]
+
+    # (start, stop, count) runs of rows sharing a count, while runs have at
+    # least min_rows rows; the rows after that come last as (start, stop, None)
+    def runs(self, min_rows=MIN_RUN_ROWS):
+        values, starts = np.unique(self.counts, return_index=True)
+        stops = [*starts[1:], len(self.counts)]
+        runs = []
+        for value, start, stop in zip(values.tolist(), starts.tolist(), stops):
+            if stop - start < min_rows:
+                return runs + [(start, len(self.counts), None)]
+            runs.append((start, stop, value))
+        return runs
+
+
+# `count` random weight vectors summing to 1, like the hand-picked weights
+def random_weights(count, seed=None):
+    return np.random.default_rng(seed).dirichlet(np.ones(len(FACTORS)), size=count)
+
+
+# Every weight vector summing to 1 in multiples of `step`. Each choice of
+# len(FACTORS) - 1 dividers among the units and dividers is one vector: the
+# gaps between dividers are the weights in units of `step`.
+def grid_weights(step):
+    units = round(1 / step)
+    if units < 1 or not np.isclose(units * step, 1):
+        raise ValueError('The grid step must divide 1')
+    slots = units + len(FACTORS) - 1
+    dividers = np.fromiter(itertools.chain.from_iterable(itertools.combinations(range(slots), len(FACTORS) - 1)),
+                           dtype=np.int64).reshape(-1, len(FACTORS) - 1)
+    edges = np.column_stack([np.full(len(dividers), -1), dividers, np.full(len(dividers), slots)])
+    return (np.diff(edges, axis=1) - 1) * step
+
+
+def threshold_grid(step=THRESHOLD_STEP):
+    return np.arange(0, MAX_TOTAL_RISK_SCORE + step / 2, step)
+
+
+# Tallies how a History's totals fall on a cut-off grid under many candidate
+# weight vectors. Scores are kept in grid units as float32, which halves the
+# memory traffic of the (rows, candidates) blocks where the time goes.
+class GridScorer:
+    def __init__(self, history, step=THRESHOLD_STEP):
+        self.thresholds = threshold_grid(step)
+        self.bins = len(self.thresholds) + 1
+        self.classes = len(history.outcome_levels) + 1
+        self.factor_units = (history.factor_scores / step).astype(np.float32)
+        # Totals within TIE_UNITS of a threshold count as equal to it, which absorbs float32 rounding
+        self.epds_units = (history.epds / step - TIE_UNITS).astype(np.float32)
+        self.class_offsets = (history.classes * self.bins).astype(np.float32)
+        self.counts = history.counts
+        self.runs = history.runs()
+
+    # histograms[k, c, j]: logs of outcome class c whose total under candidate
+    # k is above exactly j grid thresholds. A block of rows is scored against
+    # every candidate with one matrix product and tallied with one bincount.
+    def histograms(self, weights):
+        size = len(weights) * self.classes * self.bins
+        # Keys are built in float32, which is exact below 2 ** 24
+        if size >= 2 ** 24:
+            raise ValueError('Too many candidates per batch for this threshold step')
+        weights_t = np.asarray(weights, dtype=np.float32).T
+        offsets = (np.arange(len(weights)) * self.classes * self.bins).astype(np.float32)
+        histograms = np.zeros(size)
+        block_rows = max(1, MAX_BLOCK // len(weights))
+        for start, stop, count in self.runs:
+            for block_start in range(start, stop, block_rows):
+                block = slice(block_start, min(block_start + block_rows, stop))
+                keys = self.factor_units[block] @ weights_t
+                keys += self.epds_units[block, np.newaxis]
+                np.ceil(keys, out=keys)
+                np.clip(keys, 0, len(self.thresholds), out=keys)
+                keys += self.class_offsets[block, np.newaxis]
+                keys += offsets
+                keys = keys.astype(np.int64).ravel()
+                if count is None:
+                    counts = np.broadcast_to(self.counts[block, np.newaxis], (block.stop - block.start, len(weights)))
+                    histograms += np.bincount(keys, weights=counts.ravel(), minlength=size)
+                else:
+                    histograms += count * np.bincount(keys, minlength=size)
+        return histograms.reshape(len(weights), self.classes, self.bins)
+
+
+# (K, levels, thresholds) sensitivity and specificity of flagging a follow-up
+# EPDS at each outcome level whenever the total is above each grid threshold
+def rates(histograms):
+    above = histograms[:, :, ::-1].cumsum(axis=2)[:, :, ::-1][:, :, 1:]
+    class_totals = histograms.sum(axis=2)
+    sensitivity, specificity = [], []
+    for level in range(histograms.shape[1] - 1):
+        positives = class_totals[:, level + 1:].sum(axis=1)[:, np.newaxis]
+        negatives = class_totals[:, :level + 1].sum(axis=1)[:, np.newaxis]
+        sensitivity.append(above[:, level + 1:].sum(axis=1) / np.maximum(positives, 1))
+        specificity.append(1 - above[:, :level + 1].sum(axis=1) / np.maximum(negatives, 1))
+    return np.stack(sensitivity, axis=1), np.stack(specificity, axis=1)
+
+
+# Grid index of each level's cut-off: the one with the best Youden's J
+# (sensitivity + specificity - 1) above the previous level's, among those with
+# at least min_sensitivity. -1 where no cut-off qualifies.
+def choose_cutoffs(sensitivity, specificity, min_sensitivity=0.0):
+    candidates, levels, thresholds = sensitivity.shape
+    youden = np.where(sensitivity >= min_sensitivity, sensitivity + specificity - 1, -np.inf)
+    positions = np.arange(thresholds)
+    chosen = np.full((candidates, levels), -1, dtype=np.int64)
+    previous = np.full(candidates, -1)
+    for level in range(levels):
+        scores = np.where(positions > previous[:, np.newaxis], youden[:, level], -np.inf)
+        best = scores.argmax(axis=1)
+        feasible = np.isfinite(scores[np.arange(candidates), best])
+        chosen[feasible, level] = best[feasible]
+        previous = np.where(feasible, best, thresholds)
+    return chosen
+
+
+# Process pool workers receive the history once, when they start
+_worker_state = {}
+
+
+def _init_worker(history, step, min_sensitivity):
+    _worker_state.update(scorer=GridScorer(history, step), min_sensitivity=min_sensitivity)
+
+
+def _evaluate(weights):
+    sensitivity, specificity = rates(_worker_state['scorer'].histograms(weights))
+    cutoffs = choose_cutoffs(sensitivity, specificity, _worker_state['min_sensitivity'])
+    rows, levels = np.arange(len(weights))[:, np.newaxis], np.arange(cutoffs.shape[1])
+    taken = np.maximum(cutoffs, 0)
+    return (cutoffs, np.where(cutoffs >= 0, sensitivity[rows, levels, taken], np.nan),
+            np.where(cutoffs >= 0, specificity[rows, levels, taken], np.nan))
+
+
+# Fit band cut-offs for every (K, len(FACTORS)) candidate weight vector on
+# `workers` processes. Returns K-row arrays: weights, risk_bands (NaN where no
+# cut-off qualifies), sensitivity and specificity per outcome level, and their
+# mean Youden's J. Workers are spawned rather than forked, so they hold the
+# history but none of the caller's connections or threads.
+def calibrate(history, candidates, workers=None, step=THRESHOLD_STEP, min_sensitivity=0.0,
+              batch_size=CANDIDATE_BATCH):
+    candidates = np.asarray(candidates, dtype=np.float64)
+    batches = [candidates[start:start + batch_size] for start in range(0, len(candidates), batch_size)]
+    initargs = (history, step, min_sensitivity)
+    workers = min(workers or os.cpu_count() or 1, len(batches))
+    if workers <= 1:
+        _init_worker(*initargs)
+        parts = [_evaluate(batch) for batch in batches]
+    else:
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=initargs) as executor:
+            parts = list(executor.map(_evaluate, batches))
+    cutoffs, sensitivity, specificity = (np.concatenate(arrays) for arrays in zip(*parts))
+    return {
+        'weights': candidates,
+        'risk_bands': np.where(cutoffs >= 0, threshold_grid(step)[np.maximum(cutoffs, 0)], np.nan),
+        'sensitivity': sensitivity,
+        'specificity': specificity,
+        'youden': (sensitivity + specificity - 1).mean(axis=1),
+    }
+
+
+# Sensitivity and specificity per outcome level of fixed weights and cut-offs, e.g. the model in use
+def evaluate_model(history, weights, risk_bands):
+    totals = history.factor_scores @ np.asarray(weights, dtype=np.float64) + history.epds
+    sensitivity, specificity = [], []
+    for level, cutoff in enumerate(risk_bands):
+        flagged, positive = totals > cutoff, history.classes > level
+        sensitivity.append(history.counts[flagged & positive].sum() / max(history.counts[positive].sum(), 1))
+        specificity.append(history.counts[~flagged & ~positive].sum() / max(history.counts[~positive].sum(), 1))
+    return np.array(sensitivity), np.array(specificity)
+
+
+# Candidate indices, best mean Youden's J first; candidates without cut-offs go last
+def ranking(results):
+    return np.argsort(-np.nan_to_num(results['youden'], nan=-np.inf), kind='stable')
+
+
+# One CSV row per candidate, best first
+def write_report(path, results, outcome_levels):
+    bands = RISK_BAND_NAMES[:-1]
+    header = [*FACTORS, *(f'{band}_max' for band in bands),
+              *(f'sensitivity_epds{level}' for level in outcome_levels),
+              *(f'specificity_epds{level}' for level in outcome_levels), 'youden']
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for index in ranking(results):
+            writer.writerow([*(round(float(value), 6) for value in results['weights'][index]),
+                             *results['risk_bands'][index].tolist(),
+                             *(round(float(value), 6) for value in results['sensitivity'][index]),
+                             *(round(float(value), 6) for value in results['specificity'][index]),
+                             round(float(results['youden'][index]), 6)])
+
+
+# Write a weights file risk_model.load_risk_model() reads. It replaces the
+# old one in a single rename, so a scorer starting meanwhile never sees half a file.
+def write_risk_model(path, version, weights, risk_bands, **details):
+    data = {
+        'version': version,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'weights': {factor: round(float(weight), 6) for factor, weight in zip(FACTORS, weights)},
+        'risk_bands': [float(cutoff) for cutoff in risk_bands],
+        **details,
+    }
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.write('\n')
+    os.replace(temporary, path)
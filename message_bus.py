@@ -0,0 +1,107 @@
+# message_bus.py
+from threading import Event, Lock, Thread
+import queue
+
+
+# A client's view of the bus. If a client falls behind far enough to fill its
+# queue it is marked lagged, and the stream should end so the client can
+# reconnect and catch up from the database.
+class Subscription:
+    def __init__(self, user_id, maxsize):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize)
+        self.lagged = False
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.lagged = True
+
+
+# In-process fan-out of new messages to the streams of their sender and receiver
+class MessageBus:
+    def __init__(self, queue_size=1000):
+        self.queue_size = queue_size
+        self._subscriptions = {}
+        self._lock = Lock()
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id, self.queue_size)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, message):
+        self.publish_to({message['sender_id'], message['receiver_id']}, message)
+
+    def publish_to(self, user_ids, message):
+        with self._lock:
+            targets = [subscription for user_id in user_ids for subscription in self._subscriptions.get(user_id, ())]
+        for subscription in targets:
+            subscription.put(message)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+# Stand-in for an external broker when several worker processes serve the API:
+# one thread per process tails the message table and feeds the local bus, so
+# every process sees every message however many clients it holds.
+class PollingMessageBus(MessageBus):
+    def __init__(self, fetch_after, latest_id, interval=1.0, queue_size=1000):
+        super().__init__(queue_size)
+        self.fetch_after = fetch_after
+        self.latest_id = latest_id
+        self.interval = interval
+        self.last_id = None
+        self._stopped = Event()
+        self._thread = None
+        self._start_lock = Lock()
+        self._poll_lock = Lock()
+
+    def subscribe(self, user_id):
+        self.start()
+        with self._poll_lock:
+            # Nothing is polled while nobody listens, so skip what was sent meanwhile
+            if not self.subscriber_count():
+                self.last_id = self.latest_id()
+            return super().subscribe(user_id)
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self.last_id = self.latest_id()
+                self._thread = Thread(target=self._run, name='message-bus-poller', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    # Messages committed by this process arrive through the poller like all others
+    def publish(self, message):
+        pass
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            with self._poll_lock:
+                if not self.subscriber_count():
+                    continue
+                for message in self.fetch_after(self.last_id):
+                    self.last_id = max(self.last_id, message['id'])
+                    MessageBus.publish(self, message)
@@ -0,0 +1,198 @@
+# metrics.py
+from threading import Lock
+import logging
+import time
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger('postpartum.metrics')
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, values)) + '}'
+
+
+def _with_le(labels, bound):
+    return (labels[:-1] + ',' if labels else '{') + f'le="{bound}"' + '}'
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._series.items()):
+                labels = _labels(self.label_names, label_values)
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{_with_le(labels, bound)} {bucket_count}')
+                lines.append(f'{self.name}_bucket{_with_le(labels, "+Inf")} {count}')
+                lines.append(f'{self.name}_sum{labels} {total}')
+                lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.label_names, label_values)} {value}')
+        return lines
+
+
+# All API metrics, rendered in the Prometheus text exposition format
+class Metrics:
+    def __init__(self):
+        self.request_seconds = Histogram('http_request_duration_seconds', 'Request latency by endpoint.',
+                                         ('endpoint', 'method'))
+        self.requests = Counter('http_requests_total', 'Requests by endpoint and status.', ('endpoint', 'method', 'status'))
+        self.sql_statements = Histogram('sql_statements_per_request', 'SQL statements executed per request.',
+                                        ('endpoint',), COUNT_BUCKETS)
+        self.sql_seconds = Histogram('sql_duration_seconds_per_request', 'Total SQL time per request.', ('endpoint',))
+        self.jwt_decode_seconds = Histogram('jwt_decode_duration_seconds', 'Time spent in jwt.decode in token_required.')
+        self.token_cache = Counter('token_cache_lookups_total', 'Verified-token cache lookups.', ('result',))
+        self.response_cache = Counter('response_cache_lookups_total',
+                                      'Conditional GETs answered with 304, from the body cache or by a query.', ('result',))
+        self._collectors = [self.request_seconds, self.requests, self.sql_statements, self.sql_seconds,
+                            self.jwt_decode_seconds, self.token_cache, self.response_cache]
+        self._extra = []
+
+    # Register a callable returning extra exposition lines (e.g. from another component's stats)
+    def add_collector(self, collector):
+        self._extra.append(collector)
+
+    def render(self):
+        lines = []
+        for collector in self._collectors:
+            lines.extend(collector.render())
+        for collector in self._extra:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+# Request stats live on flask.g while the request (or its streamed body) runs
+def _request_stats():
+    if has_app_context():
+        return g.get('request_stats')
+    return None
+
+
+# Hook Flask request events and the SQLAlchemy events of `engines` into `metrics`.
+# With slow_request_seconds set, slower requests are logged with the queries they ran.
+def instrument(app, engines, metrics, slow_request_seconds=None, max_logged_queries=50):
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        stats = _request_stats()
+        if stats is None:
+            return
+        stats['sql_count'] += 1
+        stats['sql_seconds'] += elapsed
+        if slow_request_seconds is not None and len(stats['queries']) < max_logged_queries:
+            stats['queries'].append((elapsed, statement))
+
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+    def record(stats, endpoint, method, path, status):
+        duration = time.perf_counter() - stats['started']
+        metrics.request_seconds.observe(duration, endpoint, method)
+        metrics.requests.inc(endpoint, method, str(status))
+        metrics.sql_statements.observe(stats['sql_count'], endpoint)
+        metrics.sql_seconds.observe(stats['sql_seconds'], endpoint)
+        if slow_request_seconds is not None and duration >= slow_request_seconds:
+            queries = '\n'.join(f'  {elapsed * 1000:.1f} ms  {statement}' for elapsed, statement in stats['queries'])
+            logger.warning('Slow request %s %s took %.1f ms with %d queries (%.1f ms SQL):\n%s', method, path,
+                           duration * 1000, stats['sql_count'], stats['sql_seconds'] * 1000, queries)
+
+    # Streamed bodies run their SQL after the view returns, so they are recorded
+    # once the last chunk has been sent instead of at teardown
+    def record_after_body(body, stats, *labels):
+        try:
+            yield from body
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+            record(stats, *labels)
+
+    @app.before_request
+    def start_request():
+        g.request_stats = {'started': time.perf_counter(), 'sql_count': 0, 'sql_seconds': 0.0, 'queries': []}
+
+    @app.after_request
+    def finish_request(response):
+        stats = g.get('request_stats')
+        if stats is None:
+            return response
+        labels = (request.endpoint or 'unmatched', request.method, request.full_path, response.status_code)
+        if response.is_streamed:
+            stats['deferred'] = True
+            response.response = record_after_body(response.response, stats, *labels)
+        else:
+            stats['recorded'] = True
+            record(stats, *labels)
+        return response
+
+    # Requests that failed with an unhandled exception never reach after_request
+    @app.teardown_request
+    def finish_failed_request(error):
+        stats = g.get('request_stats')
+        if stats is not None and not stats.get('deferred') and not stats.get('recorded'):
+            stats['recorded'] = True
+            record(stats, request.endpoint or 'unmatched', request.method, request.full_path, 500)
+
+
+# Exposition lines for PasswordHasher.stats; its buckets are already cumulative
+def hashing_collector(stats):
+    def collect():
+        snapshot = stats.snapshot()
+        name = 'password_hash_duration_seconds'
+        lines = [f'# HELP {name} Queue plus hashing time per password operation.', f'# TYPE {name} histogram']
+        for bound, count in snapshot['buckets'].items():
+            lines.append(f'{name}_bucket{{le="{bound}"}} {count}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {snapshot["count"]}')
+        lines.append(f'{name}_sum {snapshot["queue_seconds_total"] + snapshot["hash_seconds_total"]}')
+        lines.append(f'{name}_count {snapshot["count"]}')
+        lines.append('# HELP password_hash_rejected_total Password operations refused because the pool was full.')
+        lines.append('# TYPE password_hash_rejected_total counter')
+        lines.append(f'password_hash_rejected_total {snapshot["rejected"]}')
+        return lines
+    return collect
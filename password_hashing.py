@@ -0,0 +1,96 @@
+# password_hashing.py
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from threading import BoundedSemaphore, Lock
+import time
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(Exception):
+    pass
+
+
+# Latency of the hashing step, split into time waiting for a worker and time hashing
+class HashingStats:
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self._lock = Lock()
+        self.count = 0
+        self.rejected = 0
+        self.queue_seconds = 0.0
+        self.hash_seconds = 0.0
+        self.max_seconds = 0.0
+        self.bucket_counts = [0] * len(self.BUCKETS)
+
+    def observe(self, queue_seconds, hash_seconds):
+        total = queue_seconds + hash_seconds
+        with self._lock:
+            self.count += 1
+            self.queue_seconds += queue_seconds
+            self.hash_seconds += hash_seconds
+            self.max_seconds = max(self.max_seconds, total)
+            for i, bound in enumerate(self.BUCKETS):
+                if total <= bound:
+                    self.bucket_counts[i] += 1
+
+    def reject(self):
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'count': self.count,
+                'rejected': self.rejected,
+                'queue_seconds_total': self.queue_seconds,
+                'hash_seconds_total': self.hash_seconds,
+                'max_seconds': self.max_seconds,
+                'buckets': dict(zip(self.BUCKETS, self.bucket_counts)),
+            }
+
+
+# Runs password hashing on a dedicated bounded pool so a burst of logins cannot tie up
+# every request worker. hashlib releases the GIL while hashing, so threads give
+# real parallelism. Requests beyond max_pending are refused with HashingBusy.
+class PasswordHasher:
+    def __init__(self, method='scrypt:32768:8:1', workers=4, max_pending=16, timeout=10.0):
+        self.method = method
+        self.timeout = timeout
+        self.stats = HashingStats()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._pending = BoundedSemaphore(max_pending)
+
+    def _run(self, function, *args):
+        if not self._pending.acquire(blocking=False):
+            self.stats.reject()
+            raise HashingBusy()
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                self.stats.observe(started - submitted, time.perf_counter() - started)
+                self._pending.release()
+
+        future = self._executor.submit(timed)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HashingBusy()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def check(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    # Stored hashes look like 'scrypt:32768:8:1$salt$hash'. A hash made with the
+    # same algorithm at a different cost is redone on the next successful login;
+    # one made with another algorithm is kept, so changing the method never
+    # silently moves existing users from one algorithm to another.
+    def needs_rehash(self, password_hash):
+        method = password_hash.split('$', 1)[0]
+        return method != self.method and method.split(':', 1)[0] == self.method.split(':', 1)[0]
@@ -0,0 +1,48 @@
+# response_cache.py
+from collections import OrderedDict
+from threading import Lock
+
+
+# Bounded LRU cache of serialized response bodies. Each body is stored with the
+# ETag it was built for and only served while that is still the resource's
+# ETag. Callers read the current ETag from the database on every request, so a
+# body is never served once any API process has changed the data behind it.
+class ResponseCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_body=1024 * 1024):
+        self.max_bytes = max_bytes
+        self.max_body = max_body
+        self._bodies = OrderedDict()
+        self._size = 0
+        self._lock = Lock()
+
+    def get(self, user_id, resource, key, etag):
+        with self._lock:
+            entry = self._bodies.get((user_id, resource, key))
+            if entry is None or entry[0] != etag:
+                return None
+            self._bodies.move_to_end((user_id, resource, key))
+            return entry[1]
+
+    # Store a body built for `etag`, replacing any older body for the same request
+    def put(self, user_id, resource, key, etag, body):
+        if len(body) > self.max_body:
+            return
+        with self._lock:
+            self._remove((user_id, resource, key))
+            self._bodies[(user_id, resource, key)] = (etag, body)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._bodies)))
+
+    def clear(self):
+        with self._lock:
+            self._bodies.clear()
+            self._size = 0
+
+    def __len__(self):
+        return len(self._bodies)
+
+    def _remove(self, body_key):
+        entry = self._bodies.pop(body_key, None)
+        if entry is not None:
+            self._size -= len(entry[1])
@@ -0,0 +1,110 @@
+# risk_model.py
+# The risk model without NumPy: factors, weights, bands, answer tables and the
+# scoring of a single check-in or screening. Vectorized scoring lives in
+# risk_scoring, which re-exports everything here.
+from bisect import bisect_left
+from pathlib import Path
+import json
+import os
+
+# Risk factors in scoring (and matrix column) order. The names match the
+# DailyLog columns so a stored log row can be scored without renaming anything.
+FACTORS = (
+    "mental_health",
+    "stress_level",
+    "social_support",
+    "physical_health",
+    "nutrition",
+    "sleep_quality",
+    "economic_stress",
+    "hormonal_changes",
+)
+
+# Hand-picked weights and total risk score bands, used when no weights file exists
+DEFAULT_WEIGHTS = {
+    "mental_health": 0.25,
+    "stress_level": 0.15,
+    "social_support": 0.20,
+    "physical_health": 0.10,
+    "nutrition": 0.10,
+    "sleep_quality": 0.10,
+    "economic_stress": 0.05,
+    "hormonal_changes": 0.05
+}
+
+# Upper bounds of the low, mild and moderate total risk score bands; anything
+# above the last one is high risk ("seek immediate medical attention")
+DEFAULT_RISK_BANDS = (6, 13, 19)
+RISK_BAND_NAMES = ("low", "mild", "moderate", "high")
+
+# Versioned weights and bands written by `flask --app app calibrate-risk`
+RISK_WEIGHTS_FILE = os.environ.get("RISK_WEIGHTS_FILE", str(Path(__file__).with_name("risk_weights.json")))
+
+
+# {"version", "weights", "risk_bands"} from a weights file, or the hand-picked
+# defaults as version 0 when the file does not exist
+def load_risk_model(path=RISK_WEIGHTS_FILE):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {"version": 0, "weights": dict(DEFAULT_WEIGHTS), "risk_bands": DEFAULT_RISK_BANDS}
+    weights = {factor: float(data["weights"][factor]) for factor in FACTORS}
+    risk_bands = tuple(data["risk_bands"])
+    if len(risk_bands) != len(RISK_BAND_NAMES) - 1 or list(risk_bands) != sorted(set(risk_bands)):
+        raise ValueError(f"{path}: risk_bands must be {len(RISK_BAND_NAMES) - 1} increasing cut-offs")
+    return {"version": int(data["version"]), "weights": weights, "risk_bands": risk_bands}
+
+
+# Loaded once at startup by every scorer: the API, calculate_risk.py and the home page
+RISK_MODEL = load_risk_model()
+WEIGHTS = RISK_MODEL["weights"]
+RISK_BANDS = RISK_MODEL["risk_bands"]
+
+# Alert thresholds, matching the interpretation shown to patients: a total risk
+# score above the top band means "seek immediate medical attention", EPDS 13+ is high risk
+TOTAL_RISK_ALERT_THRESHOLD = RISK_BANDS[-1]
+EPDS_ALERT_THRESHOLD = 13
+
+# Answer-to-score tables shared by the Streamlit pages
+MENTAL_HEALTH_SCORES = {"Feeling good": 3, "Some struggles": 6, "Need support": 10}
+STRESS_SCORES = {"Low stress": 3, "Moderate stress": 6, "High stress": 10}
+PHYSICAL_HEALTH_SCORES = {"Feeling healthy": 3, "Some concerns": 6, "Need to see a doctor": 10}
+HORMONAL_CHANGES_SCORES = {"No": 3, "Yes": 10}
+
+
+# EPDS items 1 and 2 are scored as answered (0-3); the other eight are reverse scored
+EPDS_ITEM_COUNT = 10
+EPDS_NORMAL_ITEMS = (0, 1)
+EPDS_SELF_HARM_ITEM = 9
+
+# Score of each option index for each item: EPDS_ITEM_SCORE_TABLE[item][answer_index]
+EPDS_ITEM_SCORE_TABLE = tuple((0, 1, 2, 3) if item in EPDS_NORMAL_ITEMS else (3, 2, 1, 0)
+                              for item in range(EPDS_ITEM_COUNT))
+
+
+# "low", "mild", "moderate" or "high" for a total risk score
+def risk_band(total_risk_score, risk_bands=None):
+    return RISK_BAND_NAMES[bisect_left(RISK_BANDS if risk_bands is None else risk_bands, total_risk_score)]
+
+
+# Weighted risk score for a single set of factor scores
+def calculate_weighted_score(responses, weights=None):
+    weights = WEIGHTS if weights is None else weights
+    return float(sum(responses[factor] * weights[factor] for factor in FACTORS))
+
+
+# EPDS total from the index of the chosen option for each of the ten questions
+def score_epds(answer_indices):
+    return sum(EPDS_ITEM_SCORE_TABLE[item][index] for item, index in enumerate(answer_indices))
+
+
+def pack_epds(answer_indices):
+    answer_indices = list(answer_indices)
+    if len(answer_indices) != EPDS_ITEM_COUNT or not all(
+            isinstance(index, int) and not isinstance(index, bool) and 0 <= index <= 3 for index in answer_indices):
+        raise ValueError("answers must be ten option indices between 0 and 3")
+    packed = 0
+    for item, index in enumerate(answer_indices):
+        packed |= index << (2 * item)
+    return packed
@@ -0,0 +1,111 @@
+# risk_scoring.py
+import numpy as np
+
+from risk_model import (DEFAULT_RISK_BANDS, DEFAULT_WEIGHTS, EPDS_ALERT_THRESHOLD, EPDS_ITEM_COUNT,
+                        EPDS_ITEM_SCORE_TABLE, EPDS_NORMAL_ITEMS, EPDS_SELF_HARM_ITEM, FACTORS,
+                        HORMONAL_CHANGES_SCORES, MENTAL_HEALTH_SCORES, PHYSICAL_HEALTH_SCORES, RISK_BAND_NAMES,
+                        RISK_BANDS, RISK_MODEL, RISK_WEIGHTS_FILE, STRESS_SCORES, TOTAL_RISK_ALERT_THRESHOLD, WEIGHTS,
+                        calculate_weighted_score, load_risk_model, pack_epds, risk_band, score_epds)
+
+# Score of each option index for each item: EPDS_ITEM_SCORES[item, answer_index]
+EPDS_ITEM_SCORES = np.array(EPDS_ITEM_SCORE_TABLE, dtype=np.int64)
+
+# Stored screenings pack the ten answer indices two bits each, item 1 in the
+# lowest bits, into one 20-bit integer
+EPDS_ITEM_SHIFTS = np.arange(EPDS_ITEM_COUNT, dtype=np.int64) * 2
+
+
+# Partial EPDS totals for every value of each byte of a packed screening, so a
+# whole screening is scored with three table lookups
+def _epds_byte_tables():
+    tables = np.zeros(((EPDS_ITEM_COUNT + 3) // 4, 256), dtype=np.int64)
+    for byte_value in range(256):
+        for position in range(4):
+            for table in range(len(tables)):
+                item = table * 4 + position
+                if item < EPDS_ITEM_COUNT:
+                    tables[table, byte_value] += EPDS_ITEM_SCORES[item, (byte_value >> (2 * position)) & 3]
+    return tables
+
+
+EPDS_BYTE_TABLES = _epds_byte_tables()
+
+
+def weight_vector(weights=None):
+    weights = WEIGHTS if weights is None else weights
+    return np.array([weights[factor] for factor in FACTORS], dtype=np.float64)
+
+
+# Convert raw DailyLog values into factor scores for many rows at once.
+# Categorical answers (mental_health, stress_level, physical_health) are
+# stored as their 3/6/10 score, the 1-5 sliders are stored as answered and
+# inverted here exactly like the check-in form does, and hormonal_changes is
+# a boolean. Missing values contribute nothing to the score. Rows are
+# mappings (request JSON objects or DailyLog column dicts).
+def daily_log_factor_matrix(rows):
+    raw = np.array([[np.nan if row.get(factor) is None else row.get(factor) for factor in FACTORS] for row in rows],
+                   dtype=np.float64).reshape(-1, len(FACTORS))
+    return raw_factor_scores(raw)
+
+
+# Same conversion for an (N, len(FACTORS)) array of raw DailyLog values, NaN where missing
+def raw_factor_scores(raw):
+    raw = np.asarray(raw, dtype=np.float64)
+    scores = raw.copy()
+    for factor in ("social_support", "nutrition", "sleep_quality"):
+        column = FACTORS.index(factor)
+        scores[:, column] = (6 - raw[:, column]) * 2
+    column = FACTORS.index("economic_stress")
+    scores[:, column] = raw[:, column] * 2
+    column = FACTORS.index("hormonal_changes")
+    scores[:, column] = np.where(raw[:, column] > 0, 10, 3)
+    scores[np.isnan(raw)] = 0
+    return scores
+
+
+# Weighted risk scores for an (N, len(FACTORS)) matrix of factor scores
+def score_matrix(factor_scores, weights=None):
+    factor_scores = np.asarray(factor_scores, dtype=np.float64)
+    return factor_scores @ weight_vector(weights)
+
+
+# Weighted and total (EPDS + weighted) risk scores for N rows in one pass
+def score_batch(factor_scores, epds_scores, weights=None):
+    weighted = score_matrix(factor_scores, weights)
+    total = weighted + np.asarray(epds_scores, dtype=np.float64)
+    return weighted, total
+
+
+# (N, 10) answer indices for N packed screenings
+def unpack_epds(packed):
+    packed = np.asarray(packed, dtype=np.int64)
+    return (packed[..., np.newaxis] >> EPDS_ITEM_SHIFTS) & 3
+
+
+# EPDS totals for any number of packed screenings via the byte lookup tables
+def score_packed_epds(packed):
+    packed = np.asarray(packed, dtype=np.int64)
+    total = np.zeros(packed.shape, dtype=np.int64)
+    for table, lookup in enumerate(EPDS_BYTE_TABLES):
+        total += lookup[(packed >> (8 * table)) & 0xFF]
+    return total
+
+
+# (N, 10) item scores for N packed screenings, reverse scoring applied
+def epds_item_scores(packed):
+    return EPDS_ITEM_SCORES[np.arange(EPDS_ITEM_COUNT), unpack_epds(packed)]
+
+
+# (10, 4) counts of screenings scoring 0-3 on each item
+def epds_item_distribution(packed):
+    packed = np.asarray(packed, dtype=np.int64)
+    distribution = np.zeros((EPDS_ITEM_COUNT, 4), dtype=np.int64)
+    for item in range(EPDS_ITEM_COUNT):
+        distribution[item, EPDS_ITEM_SCORES[item]] = np.bincount((packed >> (2 * item)) & 3, minlength=4)
+    return distribution
+
+
+# Mask of screenings scoring at least `min_score` on item 10 (thoughts of self-harm)
+def flag_self_harm(packed, min_score=1):
+    answers = (np.asarray(packed, dtype=np.int64) >> (2 * EPDS_SELF_HARM_ITEM)) & 3
+    return EPDS_ITEM_SCORES[EPDS_SELF_HARM_ITEM][answers] >= min_score
@@ -0,0 +1,56 @@
+# run_timing.py
+from collections import deque
+from functools import wraps
+import logging
+import time
+
+import streamlit as st
+
+logger = logging.getLogger("postpartum.timing")
+
+# Imported once per server process, so this marks the start of a cold start
+PROCESS_STARTED = time.perf_counter()
+RECENT_RUNS = 200
+
+cold_start_seconds = None
+run_times = deque(maxlen=RECENT_RUNS)
+
+
+# Called at the end of every script run; the first one also fixes the cold start time
+def record_run(label, seconds):
+    global cold_start_seconds
+    if cold_start_seconds is None:
+        cold_start_seconds = time.perf_counter() - PROCESS_STARTED
+        logger.info("cold start: %.1f ms", cold_start_seconds * 1000)
+    run_times.append((label, seconds))
+    logger.info("%s run: %.1f ms", label, seconds * 1000)
+
+
+# Time a fragment (or any render function) separately from full script runs
+def timed(label):
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record_run(label, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def summary():
+    totals = {}
+    for label, seconds in run_times:
+        totals.setdefault(label, []).append(seconds)
+    return {label: {"runs": len(samples), "mean_ms": 1000 * sum(samples) / len(samples),
+                    "max_ms": 1000 * max(samples)}
+            for label, samples in totals.items()}
+
+
+def show_sidebar():
+    with st.sidebar.expander("Performance"):
+        if cold_start_seconds is not None:
+            st.write(f"Cold start: {cold_start_seconds * 1000:.0f} ms")
+        st.table(summary())
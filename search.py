@@ -0,0 +1,97 @@
+# search.py
+from sqlalchemy import column, func, literal_column, select, table, text
+
+SNIPPET_MARKERS = ('**', '**')
+SNIPPET_TOKENS = 12
+# highlight() wraps every matched token in these, which is how hits are counted
+HIT_MARKERS = ('\x02', '\x03')
+# BM25 term-frequency saturation and document-length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+# Turn free text into an FTS5 query over the body of `user_id`'s rows. Every
+# term is quoted, so punctuation such as "can't" is tokenized like the indexed
+# text instead of being read as query syntax, and every term must match.
+def match_expression(terms, user_id):
+    phrases = ['"' + term.replace('"', '""') + '"' for term in terms.split()]
+    if not phrases:
+        raise ValueError('Missing search terms')
+    return f'owners : "u{user_id}" AND body : ({" ".join(phrases)})'
+
+
+# Score rows from SearchIndex.query() with BM25's term-frequency part, best
+# first. FTS5's bm25() also weighs each term by its rarity across the whole
+# index, which costs a pass over every match of the term in every user's rows
+# (tens of milliseconds for a common word on millions of rows); within one
+# user's matches that weight changes little, so it is left out.
+def rank_matches(rows):
+    if not rows:
+        return []
+    lengths = [max(1, len(row['hits'].split())) for row in rows]
+    average_length = sum(lengths) / len(lengths)
+    ranked = []
+    for row, length in zip(rows, lengths):
+        hits = row['hits'].count(HIT_MARKERS[0])
+        score = hits * (BM25_K1 + 1) / (hits + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length))
+        result = {key: value for key, value in row.items() if key != 'hits'}
+        result['score'] = round(score, 6)
+        ranked.append(result)
+    ranked.sort(key=lambda result: -result['score'])
+    return ranked
+
+
+# SQLite FTS5 index over one text column of `source`. The index keeps its own
+# copy of the text, which snippet() needs, and is filled by triggers on the
+# source table, so every insert path (single writes, /sync, group commits,
+# shard rebalancing) keeps it in sync. The `owners` column holds a u<id> token
+# per owner column; queries AND it with the terms, so FTS5 intersects one
+# user's short doclist with the term's instead of filtering every match of a
+# common word.
+class SearchIndex:
+    def __init__(self, name, source, body, owners, date):
+        self.name = name
+        self.source = source
+        self.body = body
+        self.owners = tuple(owners)
+        self.date = date
+        self._fts = table(name, column('rowid'))
+
+    def _owner_tokens(self, prefix):
+        return " || ' ' || ".join(f"'u' || {prefix}{owner}" for owner in self.owners)
+
+    def create(self, connection):
+        name, source = self.name, self.source.name
+        connection.execute(text(f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5(body, owners, tokenize='porter unicode61')"))
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {name}_insert AFTER INSERT ON {source} "
+            f"WHEN NEW.{self.body} IS NOT NULL AND NEW.{self.body} != '' BEGIN "
+            f"INSERT INTO {name}(rowid, body, owners) VALUES (NEW.id, NEW.{self.body}, {self._owner_tokens('NEW.')}); END"))
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {name}_delete AFTER DELETE ON {source} BEGIN "
+            f"DELETE FROM {name} WHERE rowid = OLD.id; END"))
+
+    # Re-index every row of the source table, e.g. for rows written before the index existed
+    def rebuild(self, connection):
+        self.create(connection)
+        connection.execute(text(f'DELETE FROM {self.name}'))
+        connection.execute(text(
+            f"INSERT INTO {self.name}(rowid, body, owners) "
+            f"SELECT id, {self.body}, {self._owner_tokens('')} FROM {self.source.name} "
+            f"WHERE {self.body} IS NOT NULL AND {self.body} != ''"))
+        # Merge the index into one b-tree, the fastest layout to query
+        connection.execute(text(f"INSERT INTO {self.name}({self.name}) VALUES ('optimize')"))
+
+    # The newest `limit` matches of a match_expression(), with the source row's
+    # id, date and owner columns, a snippet of the body and the marked-up body
+    # rank_matches() scores
+    def query(self, match, limit):
+        fts = literal_column(self.name)
+        return (select(self.source.c.id, self.source.c[self.date].label('date'),
+                       *(self.source.c[owner] for owner in self.owners),
+                       func.snippet(fts, 0, *SNIPPET_MARKERS, '…', SNIPPET_TOKENS).label('snippet'),
+                       func.highlight(fts, 0, *HIT_MARKERS).label('hits'))
+                .select_from(self._fts.join(self.source, self.source.c.id == self._fts.c.rowid))
+                .where(fts.op('MATCH')(match))
+                .order_by(self._fts.c.rowid.desc())
+                .limit(limit))
@@ -0,0 +1,74 @@
+# serializers.py
+from functools import lru_cache
+import json
+
+from sqlalchemy import Date, DateTime, select
+
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+# Same HTTP-date text Flask's JSON provider produces, without going through
+# email.utils. Dates repeat across a patient's history, so they are memoized.
+@lru_cache(maxsize=4096)
+def http_date(value):
+    return f"{WEEKDAYS[value.weekday()]}, {value.day:02d} {MONTHS[value.month - 1]} {value.year} 00:00:00 GMT"
+
+
+def http_datetime(value):
+    return (f"{WEEKDAYS[value.weekday()]}, {value.day:02d} {MONTHS[value.month - 1]} {value.year} "
+            f"{value.hour:02d}:{value.minute:02d}:{value.second:02d} GMT")
+
+
+def _date_converter(value):
+    return None if value is None else http_date(value)
+
+
+def _datetime_converter(value):
+    return None if value is None else http_datetime(value)
+
+
+def _iso_converter(value):
+    return None if value is None else value.isoformat()
+
+
+# Serializer for one table: the column tuple and the per-column converters are
+# worked out once, so reads run a Core select() and encode plain row tuples.
+# iso_dates writes dates and timestamps as ISO 8601 instead of HTTP dates.
+class RowSerializer:
+    def __init__(self, table, exclude=(), iso_dates=False):
+        self.table = table
+        self.iso_dates = iso_dates
+        self.columns = tuple(sorted((column for column in table.columns if column.name not in exclude),
+                                    key=lambda column: column.name))
+        self.names = tuple(column.name for column in self.columns)
+        self._converters = tuple(self._converter(column) for column in self.columns)
+        self._needs_conversion = any(converter is not None for converter in self._converters)
+        self._encoder = json.JSONEncoder(separators=(",", ":"))
+
+    def _converter(self, column):
+        if self.iso_dates and isinstance(column.type, (Date, DateTime)):
+            return _iso_converter
+        if isinstance(column.type, DateTime):
+            return _datetime_converter
+        if isinstance(column.type, Date):
+            return _date_converter
+        return None
+
+    def select(self):
+        return select(*self.columns)
+
+    def to_dict(self, row):
+        if self._needs_conversion:
+            row = [value if converter is None else converter(value) for converter, value in zip(self._converters, row)]
+        return dict(zip(self.names, row))
+
+    def to_json(self, row):
+        return self._encoder.encode(self.to_dict(row))
+
+    def mapping_to_json(self, mapping):
+        return self.to_json([mapping[name] for name in self.names])
+
+    def from_object(self, obj):
+        return self.to_dict([getattr(obj, name) for name in self.names])
+
@@ -0,0 +1,159 @@
+# sharding.py
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import re
+import zlib
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from group_commit import SQLITE_PRAGMAS, GroupCommitWriter, configure_sqlite
+
+# Shard i hands out ids congruent to i + 1 modulo ID_STRIDE, so ids stay unique
+# across shards and rows keep their id when they are moved to another shard
+ID_STRIDE = 1024
+
+# Last id handed out per table, kept on each shard
+shard_sequence = Table('shard_sequence', MetaData(),
+                       Column('name', String(50), primary_key=True),
+                       Column('last_id', Integer, nullable=False))
+
+
+def shard_for(user_id, count):
+    return zlib.crc32(str(user_id).encode()) % count
+
+
+# postpartum_health.db -> postpartum_health_shard0.db, ... next to the main database
+def shard_url(url, index):
+    if not url.database or url.database == ':memory:':
+        raise ValueError('Sharded storage needs a file database')
+    path = Path(url.database)
+    return url.set(database=str(path.with_name(f'{path.stem}_shard{index}{path.suffix}')))
+
+
+# Indexes of the shard files that exist next to the main database, whatever the shard count
+def existing_shards(url):
+    path = Path(url.database)
+    pattern = re.compile(re.escape(path.stem) + r'_shard(\d+)' + re.escape(path.suffix) + '$')
+    matches = (pattern.match(candidate.name) for candidate in path.parent.glob(f'{path.stem}_shard*{path.suffix}'))
+    return sorted(int(match.group(1)) for match in matches if match)
+
+
+# Smallest id of shard `index`'s class that is >= floor
+def id_at_least(index, floor):
+    return floor + (index + 1 - floor) % ID_STRIDE
+
+
+def create_shard_engine(url, index, engine_options=None):
+    return create_engine(shard_url(url, index), **(engine_options or {}))
+
+
+# Routes each patient's rows to one of `count` SQLite files by a hash of the user
+# id. Each shard has its own engine, its own request-scoped session and, in
+# production mode, its own group-commit writer, so writes for patients on
+# different shards never wait on the same lock.
+class ShardRouter:
+    def __init__(self, url, count, engine_options=None, scopefunc=None, production=False,
+                 group_commit_window=0.002, group_commit_max_batch=256):
+        self.url = url
+        self.count = count
+        self.engines = []
+        self.sessions = []
+        self.writers = []
+        for index in range(count):
+            engine = create_shard_engine(url, index, engine_options)
+            if production:
+                # Shards have no user table, so their foreign keys to it cannot be enforced
+                configure_sqlite(engine, {**SQLITE_PRAGMAS, 'foreign_keys': 'OFF'})
+                self.writers.append(GroupCommitWriter(engine, group_commit_window, group_commit_max_batch))
+            self.engines.append(engine)
+            self.sessions.append(scoped_session(sessionmaker(bind=engine), scopefunc=scopefunc))
+        self._executor = ThreadPoolExecutor(count, thread_name_prefix='shard-query')
+
+    def shard_for(self, user_id):
+        return shard_for(user_id, self.count)
+
+    def session(self, user_id):
+        return self.sessions[self.shard_for(user_id)]
+
+    # {shard index: [user ids]} for the given users
+    def group(self, user_ids):
+        shards = {}
+        for user_id in user_ids:
+            shards.setdefault(self.shard_for(user_id), []).append(user_id)
+        return shards
+
+    # Run job(connection) on the user's shard and commit it, like app.run_write
+    def run_write(self, user_id, job):
+        index = self.shard_for(user_id)
+        if self.writers:
+            return self.writers[index].submit(job)
+        session = self.sessions[index]
+        result = job(session.connection())
+        session.commit()
+        return result
+
+    def remove_sessions(self):
+        for session in self.sessions:
+            session.remove()
+
+    # fn(engine, *per-shard args) on every shard at once; results in shard order.
+    # SQLite releases the GIL while a query runs, so shards are read in parallel.
+    def fan_out(self, fn, *args):
+        return list(self._executor.map(fn, self.engines, *args))
+
+    # Create `tables` on every shard and move their id sequences past `floors`
+    # ({table name: highest id used anywhere}), so no id is handed out twice
+    def create_tables(self, tables, floors=None):
+        for index, engine in enumerate(self.engines):
+            with engine.begin() as connection:
+                for table in (shard_sequence, *tables):
+                    table.create(connection, checkfirst=True)
+                connection.execute(sqlite_insert(shard_sequence).on_conflict_do_nothing(), [
+                    {'name': table.name, 'last_id': index + 1 - ID_STRIDE} for table in tables if 'id' in table.c])
+                for name, floor in (floors or {}).items():
+                    last_id = id_at_least(index, floor)
+                    connection.execute(shard_sequence.update().where(shard_sequence.c.name == name,
+                                                                     shard_sequence.c.last_id < last_id)
+                                       .values(last_id=last_id))
+
+    # Give each row dict the next ids of the table on this connection's shard
+    @staticmethod
+    def assign_ids(connection, table, rows):
+        if not rows:
+            return
+        connection.execute(shard_sequence.update().where(shard_sequence.c.name == table.name)
+                           .values(last_id=shard_sequence.c.last_id + len(rows) * ID_STRIDE))
+        last_id = connection.execute(select(shard_sequence.c.last_id).where(shard_sequence.c.name == table.name)).scalar_one()
+        for offset, row in enumerate(rows):
+            row['id'] = last_id - (len(rows) - 1 - offset) * ID_STRIDE
+
+
+# Copy each row of `table` in `source` to the engine destination(row) returns and
+# delete it from `source`, unless that is where it belongs. Rows are copied before
+# they are deleted and copies skip ids already present, so an interrupted move
+# can simply be run again. Returns the number of rows copied.
+def move_rows(source, table, destination, batch_size=5000):
+    copied = 0
+    last_id = 0
+    while True:
+        with source.connect() as connection:
+            batch = connection.execute(select(table).where(table.c.id > last_id).order_by(table.c.id)
+                                       .limit(batch_size)).mappings().all()
+        if not batch:
+            return copied
+        last_id = batch[-1]['id']
+        copies, leaving = {}, []
+        for row in batch:
+            engine = destination(row)
+            if engine is not source:
+                copies.setdefault(engine, []).append(dict(row))
+                leaving.append(row['id'])
+        for engine, rows in copies.items():
+            with engine.begin() as connection:
+                connection.execute(sqlite_insert(table).on_conflict_do_nothing(), rows)
+            copied += len(rows)
+        if leaving:
+            with source.begin() as connection:
+                connection.execute(table.delete().where(table.c.id.in_(leaving)))
@@ -0,0 +1,45 @@
+# tests/conftest.py
+# app.py reads its configuration when it is first imported, so every test module
+# shares one app and one freshly migrated database for the whole session. Tests
+# create their own users with unique names rather than relying on an empty database.
+from datetime import datetime, timedelta
+import itertools
+import os
+import sys
+
+import jwt
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + str(tmp_path_factory.mktemp('db') / 'test.db')
+    import app
+    with app.app.app_context():
+        app.migrate_schema()
+    return app
+
+
+@pytest.fixture(scope='session')
+def client(app_module):
+    return app_module.app.test_client()
+
+
+# make_user(**fields) adds a user and returns their id and Authorization headers
+@pytest.fixture(scope='session')
+def make_user(app_module):
+    numbers = itertools.count()
+
+    def make(**fields):
+        name = f'test_user{next(numbers)}'
+        with app_module.app.app_context():
+            user = app_module.User(username=name, email=f'{name}@example.com', **fields)
+            app_module.db.session.add(user)
+            app_module.db.session.commit()
+            user_id = user.id
+        token = jwt.encode({'user_id': user_id, 'exp': datetime.utcnow() + timedelta(hours=1)},
+                           app_module.app.config['SECRET_KEY'], algorithm='HS256')
+        return user_id, {'Authorization': token}
+    return make
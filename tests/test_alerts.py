@@ -0,0 +1,46 @@
+# tests/test_alerts.py
+# The alert worker pairs each new row with the patient's latest record of the
+# other kind on or before that row's date, never with a later one.
+from datetime import date, timedelta
+import json
+
+import pytest
+
+LOW_RISK = {'mental_health': 3, 'stress_level': 3, 'social_support': 5, 'physical_health': 3, 'nutrition': 5,
+            'sleep_hours': 8, 'sleep_quality': 5, 'economic_stress': 1, 'hormonal_changes': False}
+
+
+def sync(client, headers, *records):
+    body = '\n'.join(json.dumps(record) for record in records)
+    response = client.post('/sync', headers=headers, data=body, content_type='application/x-ndjson')
+    assert response.status_code == 201
+
+
+@pytest.fixture
+def candidates(app_module):
+    def evaluate(user_id, logs=(), scores=()):
+        with app_module.app.app_context():
+            return app_module.alert_candidates([(user_id, list(logs), list(scores))])
+    return evaluate
+
+
+def test_back_dated_screening_is_not_paired_with_a_later_check_in(client, make_user, candidates):
+    user_id, headers = make_user()
+    assert client.post('/daily_log', headers=headers, json=LOW_RISK).status_code == 201
+    back_dated = date.today() - timedelta(days=60)
+    sync(client, headers, {'type': 'epds', 'date': back_dated.isoformat(), 'score': 24})
+    found = candidates(user_id, scores=[{'user_id': user_id, 'date': back_dated, 'score': 24}])
+    assert set(found) == {(user_id, 'epds', back_dated)}
+
+    today = {'user_id': user_id, 'date': date.today(), 'score': 24}
+    assert (user_id, 'total_risk', date.today()) in candidates(user_id, scores=[today])
+
+
+def test_back_dated_check_in_is_not_paired_with_a_later_screening(client, make_user, candidates):
+    user_id, headers = make_user()
+    assert client.post('/epds', headers=headers, json={'score': 24}).status_code == 201
+    back_dated = date.today() - timedelta(days=60)
+    sync(client, headers, {'type': 'daily_log', 'date': back_dated.isoformat(), **LOW_RISK})
+    assert candidates(user_id, logs=[{'user_id': user_id, 'date': back_dated, **LOW_RISK}]) == {}
+
+    assert (user_id, 'total_risk', date.today()) in candidates(user_id, logs=[{'user_id': user_id, 'date': date.today(), **LOW_RISK}])
@@ -0,0 +1,51 @@
+# tests/test_conditional_get.py
+# Conditional GETs and the response cache never serve data older than the last write.
+import pytest
+
+CHECK_IN = {'mental_health': 3, 'stress_level': 6, 'social_support': 4, 'physical_health': 3, 'nutrition': 4,
+            'sleep_hours': 7, 'sleep_quality': 4, 'economic_stress': 2, 'hormonal_changes': False}
+
+
+@pytest.fixture
+def patient(make_user):
+    return make_user()
+
+
+def test_write_changes_the_etag(client, patient):
+    _, headers = patient
+    first = client.get('/daily_log', headers=headers)
+    assert client.get('/daily_log', headers={**headers, 'If-None-Match': first.headers['ETag']}).status_code == 304
+    assert client.post('/daily_log', headers=headers, json=CHECK_IN).status_code == 201
+    second = client.get('/daily_log', headers=headers)
+    assert second.headers['ETag'] != first.headers['ETag']
+
+
+def test_stale_if_none_match_gets_fresh_data(client, patient):
+    _, headers = patient
+    assert client.post('/epds', headers=headers, json={'score': 5}).status_code == 201
+    stale = client.get('/epds', headers=headers)
+    assert client.post('/epds', headers=headers, json={'score': 12}).status_code == 201
+    response = client.get('/epds', headers={**headers, 'If-None-Match': stale.headers['ETag']})
+    assert response.status_code == 200
+    assert sorted(row['score'] for row in response.get_json()) == [5, 12]
+    assert response.headers['ETag'] != stale.headers['ETag']
+
+
+def test_streamed_body_is_cached_only_under_its_own_version(app_module, client, patient):
+    user_id, headers = patient
+    for _ in range(3):
+        assert client.post('/daily_log', headers=headers, json=CHECK_IN).status_code == 201
+    # A write lands while the body is still being streamed
+    streaming = client.get('/daily_log', headers=headers, buffered=False)
+    chunks = iter(streaming.response)
+    next(chunks)
+    assert client.post('/daily_log', headers=headers, json=CHECK_IN).status_code == 201
+    list(chunks)
+    streaming.close()
+    cache = app_module.response_cache
+    assert cache.get(user_id, 'daily_log', b'', streaming.headers['ETag'].strip('"')) is not None
+
+    response = client.get('/daily_log', headers=headers)
+    assert response.headers['ETag'] != streaming.headers['ETag']
+    assert len(response.get_json()) == 4
+    assert cache.get(user_id, 'daily_log', b'', response.headers['ETag'].strip('"')) == response.get_data()
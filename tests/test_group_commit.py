@@ -0,0 +1,102 @@
+# tests/test_group_commit.py
+# The group-commit writer's promises: a failing job does not undo the rest of
+# its batch, a job whose caller timed out never commits, and callers return only
+# once their data is committed and visible to other connections.
+import os
+import sys
+import threading
+import time
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, event, select
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from group_commit import GroupCommitWriter, WriteQueueFull, configure_sqlite  # noqa: E402
+
+metadata = MetaData()
+rows_table = Table('row', metadata, Column('id', Integer, primary_key=True))
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/writes.db')
+    configure_sqlite(engine)
+    metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def committed_ids(engine):
+    with engine.connect() as connection:
+        return [row[0] for row in connection.execute(select(rows_table.c.id).order_by(rows_table.c.id))]
+
+
+def insert(row_id):
+    return lambda connection: connection.execute(rows_table.insert(), {'id': row_id})
+
+
+def test_failing_job_does_not_roll_back_its_batch(engine):
+    writer = GroupCommitWriter(engine, window=0.5)
+    outcomes = {}
+
+    def failing(connection):
+        connection.execute(rows_table.insert(), {'id': 2})
+        raise ValueError('bad row')
+
+    def submit(name, job):
+        try:
+            writer.submit(job)
+            outcomes[name] = 'ok'
+        except ValueError:
+            outcomes[name] = 'failed'
+
+    threads = [threading.Thread(target=submit, args=(name, job))
+               for name, job in (('first', insert(1)), ('failing', failing), ('last', insert(3)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert outcomes == {'first': 'ok', 'failing': 'failed', 'last': 'ok'}
+    assert committed_ids(engine) == [1, 3]
+
+
+def test_timed_out_job_never_commits(engine):
+    writer = GroupCommitWriter(engine, window=0)
+    started, release = threading.Event(), threading.Event()
+
+    def blocking(connection):
+        started.set()
+        release.wait()
+        connection.execute(rows_table.insert(), {'id': 1})
+
+    blocker = threading.Thread(target=writer.submit, args=(blocking,))
+    blocker.start()
+    started.wait()
+    with pytest.raises(WriteQueueFull):
+        writer.submit(insert(2), timeout=0.1)
+    release.set()
+    blocker.join()
+    writer.submit(insert(3))
+
+    assert committed_ids(engine) == [1, 3]
+
+
+def test_callers_return_after_commit(engine):
+    writer = GroupCommitWriter(engine, window=0.05)
+    # Slow every COMMIT down, so a caller released early would not see its row
+    event.listen(engine, 'commit', lambda connection: time.sleep(0.1))
+    visible = {}
+
+    def submit(row_id):
+        writer.submit(insert(row_id))
+        visible[row_id] = row_id in committed_ids(engine)
+
+    threads = [threading.Thread(target=submit, args=(row_id,)) for row_id in range(1, 6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert visible == {row_id: True for row_id in range(1, 6)}
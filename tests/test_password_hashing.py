@@ -0,0 +1,25 @@
+# tests/test_password_hashing.py
+# Stored hashes are only ever redone within their own algorithm.
+from werkzeug.security import generate_password_hash
+
+from password_hashing import PasswordHasher
+
+
+def test_rehash_stays_within_the_algorithm():
+    scrypt = PasswordHasher('scrypt:16384:8:1', workers=1)
+    assert not scrypt.needs_rehash(generate_password_hash('secret', 'scrypt:16384:8:1'))
+    assert scrypt.needs_rehash(generate_password_hash('secret', 'scrypt:32768:8:1'))
+    assert not scrypt.needs_rehash(generate_password_hash('secret', 'pbkdf2:sha256:1000'))
+
+    pbkdf2 = PasswordHasher('pbkdf2:sha256:2000', workers=1)
+    assert pbkdf2.needs_rehash(generate_password_hash('secret', 'pbkdf2:sha256:1000'))
+    assert not pbkdf2.needs_rehash(generate_password_hash('secret', 'scrypt:16384:8:1'))
+
+
+def test_new_users_get_werkzeugs_scrypt_hash(app_module, client):
+    user = {'username': 'scrypt_user', 'email': 'scrypt_user@example.com', 'password': 'secret'}
+    assert client.post('/register', json=user).status_code == 201
+    assert client.post('/login', json=user).status_code == 200
+    with app_module.app.app_context():
+        stored = app_module.User.query.filter_by(username='scrypt_user').one().password_hash
+    assert stored.startswith('scrypt:32768:8:1$')
@@ -0,0 +1,73 @@
+# tests/test_physician_scope.py
+# Physicians read the data of patients assigned to them and of unassigned
+# patients, never that of another physician's patients. Other test modules may add
+# unassigned patients, so the checks are about who is in or out, not exact sets.
+import csv
+import io
+
+import pytest
+
+CHECK_IN = {'mental_health': 10, 'stress_level': 10, 'social_support': 1, 'physical_health': 10, 'nutrition': 1,
+            'sleep_hours': 4.0, 'sleep_quality': 1, 'economic_stress': 5, 'hormonal_changes': True, 'notes': 'crying'}
+
+
+@pytest.fixture(scope='module')
+def clinic(client, make_user):
+    ids, headers = {}, {}
+    for name in ('doctor', 'other_doctor'):
+        ids[name], headers[name] = make_user(is_physician=True)
+    for name, physician in (('own', 'doctor'), ('other', 'other_doctor'), ('unassigned', None)):
+        ids[name], headers[name] = make_user(physician_id=ids.get(physician))
+    # The other physician's patient is the highest risk in the clinic
+    for name, check_in in (('own', {**CHECK_IN, 'mental_health': 3}), ('other', CHECK_IN),
+                           ('unassigned', {**CHECK_IN, 'stress_level': 3})):
+        assert client.post('/daily_log', headers=headers[name], json=check_in).status_code == 201
+    return client, ids, headers
+
+
+def get(clinic, user, path):
+    client, _, headers = clinic
+    return client.get(path, headers=headers[user])
+
+
+@pytest.mark.parametrize('path', ['/summary/{}', '/trends/{}', '/search?q=crying&user_id={}'])
+def test_per_patient_routes_are_scoped(clinic, path):
+    _, ids, _ = clinic
+    assert get(clinic, 'doctor', path.format(ids['own'])).status_code == 200
+    assert get(clinic, 'doctor', path.format(ids['unassigned'])).status_code == 200
+    assert get(clinic, 'doctor', path.format(ids['other'])).status_code == 403
+    assert get(clinic, 'doctor', path.format(ids['other_doctor'])).status_code == 404
+    assert get(clinic, 'other_doctor', path.format(ids['other'])).status_code == 200
+    assert get(clinic, 'own', path.format(ids['other'])).status_code == 403
+
+
+def test_export_is_scoped(clinic):
+    _, ids, _ = clinic
+    response = get(clinic, 'doctor', '/export?format=csv')
+    exported = {int(row['user_id']) for row in csv.DictReader(io.StringIO(response.text))}
+    assert {ids['own'], ids['unassigned']} <= exported and ids['other'] not in exported
+    assert get(clinic, 'doctor', f"/export?user_ids={ids['own']},{ids['other']}").status_code == 403
+
+
+def test_panel_and_top_k_exclude_other_physicians_patients(clinic):
+    _, ids, _ = clinic
+    panel = {patient['user_id'] for patient in get(clinic, 'doctor', '/physician/patients').get_json()}
+    assert {ids['own'], ids['unassigned']} <= panel and ids['other'] not in panel
+    top = get(clinic, 'doctor', '/physician/patients?top_k=1').get_json()
+    assert len(top) == 1 and top[0]['user_id'] != ids['other']
+    other_panel = {patient['user_id'] for patient in get(clinic, 'other_doctor', '/physician/patients').get_json()}
+    assert {ids['other'], ids['unassigned']} <= other_panel and ids['own'] not in other_panel
+
+
+def test_epds_item_flags_are_scoped(clinic):
+    from risk_model import EPDS_ITEM_SCORE_TABLE, EPDS_SELF_HARM_ITEM
+    client, ids, headers = clinic
+    answers = [0] * 10
+    answers[EPDS_SELF_HARM_ITEM] = EPDS_ITEM_SCORE_TABLE[EPDS_SELF_HARM_ITEM].index(3)
+    for name in ('own', 'other'):
+        assert client.post('/epds', headers=headers[name], json={'answers': answers}).status_code == 201
+
+    def flagged(physician):
+        return {flag['user_id'] for flag in get(clinic, physician, '/physician/epds_items').get_json()['self_harm_flags']}
+    assert ids['own'] in flagged('doctor') and ids['other'] not in flagged('doctor')
+    assert ids['other'] in flagged('other_doctor') and ids['own'] not in flagged('other_doctor')
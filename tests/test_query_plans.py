@@ -0,0 +1,8 @@
+# tests/test_query_plans.py
+# Every hot query must be answered through an index; the same check as
+# `flask --app app check-query-plans`, run against a freshly built schema.
+
+
+def test_hot_queries_use_an_index(app_module):
+    with app_module.app.app_context():
+        assert app_module.full_scans() == {}
@@ -0,0 +1,40 @@
+# tests/test_record_validation.py
+# POST /daily_log, /epds and /sync accept only values the risk scorer was built
+# for, so a bad check-in can neither raise a false alert nor skew the rollups.
+import json
+
+import pytest
+
+VALID = {'mental_health': 6, 'stress_level': 10, 'social_support': 3, 'physical_health': 3, 'nutrition': 5,
+         'sleep_hours': 7.5, 'sleep_quality': 1, 'economic_stress': 2, 'hormonal_changes': False, 'notes': 'ok'}
+
+
+@pytest.fixture(scope='module')
+def patient(make_user):
+    return make_user()[1]
+
+
+def test_valid_check_in_is_stored(client, patient):
+    assert client.post('/daily_log', headers=patient, json=VALID).status_code == 201
+
+
+@pytest.mark.parametrize('field, value', [
+    ('mental_health', 999), ('mental_health', 5), ('stress_level', 0), ('physical_health', True),
+    ('social_support', 0), ('nutrition', 6), ('sleep_quality', True), ('economic_stress', 2.5),
+    ('sleep_hours', -1), ('sleep_hours', 25), ('sleep_hours', True), ('hormonal_changes', 1),
+])
+def test_out_of_domain_values_are_rejected(client, patient, field, value):
+    response = client.post('/daily_log', headers=patient, json={**VALID, field: value})
+    assert response.status_code == 400
+    assert field in response.get_json()['message']
+
+
+def test_boolean_epds_score_is_rejected(client, patient):
+    assert client.post('/epds', headers=patient, json={'score': True}).status_code == 400
+
+
+def test_sync_rejects_out_of_domain_records(client, patient):
+    body = json.dumps({'type': 'daily_log', 'date': '2026-01-01', **VALID, 'mental_health': 999})
+    response = client.post('/sync', headers=patient, data=body, content_type='application/x-ndjson')
+    assert response.status_code == 400
+    assert response.get_json()['inserted'] == {'daily_log': 0, 'epds': 0}
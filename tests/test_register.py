@@ -0,0 +1,12 @@
+# tests/test_register.py
+# A username or email that is already taken is answered with 409, like PUT /profile.
+
+
+def test_duplicate_username_or_email_is_a_conflict(client):
+    user = {'username': 'register_user', 'email': 'register_user@example.com', 'password': 'secret'}
+    assert client.post('/register', json=user).status_code == 201
+    for duplicate in (user, {**user, 'email': 'other@example.com'}, {**user, 'username': 'other_user'}):
+        response = client.post('/register', json=duplicate)
+        assert response.status_code == 409
+        assert response.get_json() == {'message': 'Username or email already in use'}
+    assert client.post('/login', json=user).status_code == 200
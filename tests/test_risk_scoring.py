@@ -0,0 +1,51 @@
+# tests/test_risk_scoring.py
+# The packed, table-driven EPDS scoring agrees with the plain per-item scoring
+# of score_epds, reverse-scored items and the item-10 self-harm flag included.
+import random
+
+import numpy as np
+
+from risk_model import EPDS_ITEM_COUNT, EPDS_ITEM_SCORE_TABLE, EPDS_SELF_HARM_ITEM, pack_epds, score_epds
+from risk_scoring import epds_item_distribution, epds_item_scores, flag_self_harm, score_packed_epds, unpack_epds
+
+rng = random.Random(7)
+ANSWERS = [[rng.randint(0, 3) for _ in range(EPDS_ITEM_COUNT)] for _ in range(2000)]
+ANSWERS += [[0] * EPDS_ITEM_COUNT, [3] * EPDS_ITEM_COUNT]
+PACKED = np.array([pack_epds(answers) for answers in ANSWERS], dtype=np.int64)
+
+
+def item_scores(answers):
+    return [EPDS_ITEM_SCORE_TABLE[item][index] for item, index in enumerate(answers)]
+
+
+def test_packing_round_trips():
+    assert unpack_epds(PACKED).tolist() == ANSWERS
+
+
+def test_packed_totals_match_score_epds():
+    assert score_packed_epds(PACKED).tolist() == [score_epds(answers) for answers in ANSWERS]
+    assert score_packed_epds(pack_epds([0] * EPDS_ITEM_COUNT)) == score_epds([0] * EPDS_ITEM_COUNT)
+
+
+def test_reverse_scored_items():
+    assert epds_item_scores(PACKED).tolist() == [item_scores(answers) for answers in ANSWERS]
+    # Items 1 and 2 score the option index as is, items 3-10 are reverse scored
+    assert item_scores([3] * EPDS_ITEM_COUNT) == [3, 3] + [0] * (EPDS_ITEM_COUNT - 2)
+
+
+def test_item_distribution_counts_scores():
+    expected = np.zeros((EPDS_ITEM_COUNT, 4), dtype=np.int64)
+    for answers in ANSWERS:
+        for item, score in enumerate(item_scores(answers)):
+            expected[item, score] += 1
+    assert epds_item_distribution(PACKED).tolist() == expected.tolist()
+
+
+def test_self_harm_flags_item_10_score():
+    for min_score in (1, 2, 3):
+        expected = [item_scores(answers)[EPDS_SELF_HARM_ITEM] >= min_score for answers in ANSWERS]
+        assert flag_self_harm(PACKED, min_score).tolist() == expected
+    # Only item 10 counts: every other item at its worst does not raise a flag
+    answers = [EPDS_ITEM_SCORE_TABLE[item].index(3) for item in range(EPDS_ITEM_COUNT)]
+    answers[EPDS_SELF_HARM_ITEM] = EPDS_ITEM_SCORE_TABLE[EPDS_SELF_HARM_ITEM].index(0)
+    assert not flag_self_harm(np.array([pack_epds(answers)]))[0]
@@ -0,0 +1,182 @@
+# tests/test_sharding.py
+# Id allocation across shards, interrupted row moves, and a full rebalance from
+# one database to several shards and back. SHARD_COUNT is read when app.py is
+# imported, so the rebalance runs each step in its own process.
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, func, select
+from sqlalchemy.engine import make_url
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sharding import ID_STRIDE, ShardRouter, move_rows  # noqa: E402
+
+metadata = MetaData()
+rows_table = Table('row', metadata, Column('id', Integer, primary_key=True), Column('user_id', Integer, nullable=False))
+
+
+def all_rows(engine):
+    with engine.connect() as connection:
+        return [tuple(row) for row in connection.execute(select(rows_table).order_by(rows_table.c.id))]
+
+
+@pytest.fixture
+def router(tmp_path):
+    router = ShardRouter(make_url(f'sqlite:///{tmp_path}/main.db'), 3)
+    router.create_tables([rows_table])
+    yield router
+    router.remove_sessions()
+    for engine in router.engines:
+        engine.dispose()
+
+
+def insert(router, user_id, count):
+    def job(connection):
+        rows = [{'user_id': user_id} for _ in range(count)]
+        router.assign_ids(connection, rows_table, rows)
+        connection.execute(rows_table.insert(), rows)
+    router.run_write(user_id, job)
+
+
+def test_ids_are_unique_across_shards(router):
+    for user_id in range(1, 31):
+        insert(router, user_id, user_id % 4 + 1)
+    ids = []
+    for index, engine in enumerate(router.engines):
+        shard_ids = [row[0] for row in all_rows(engine)]
+        assert all(row_id % ID_STRIDE == index + 1 for row_id in shard_ids)
+        ids.extend(shard_ids)
+    assert len(ids) == sum(user_id % 4 + 1 for user_id in range(1, 31))
+    assert len(set(ids)) == len(ids)
+
+
+def test_create_tables_moves_sequences_past_existing_ids(router):
+    router.create_tables([rows_table], {'row': 5 * ID_STRIDE})
+    for user_id in range(1, 31):
+        insert(router, user_id, 1)
+    ids = [row[0] for engine in router.engines for row in all_rows(engine)]
+    assert min(ids) > 5 * ID_STRIDE
+    assert len(set(ids)) == len(ids)
+
+
+def test_interrupted_move_can_run_again(tmp_path):
+    engines = [create_engine(f'sqlite:///{tmp_path}/{name}.db') for name in ('source', 'even', 'odd')]
+    source, even, odd = engines
+    for engine in engines:
+        metadata.create_all(engine)
+    expected = [(row_id, row_id % 7) for row_id in range(1, 101)]
+    with source.begin() as connection:
+        connection.execute(rows_table.insert(), [{'id': row_id, 'user_id': user_id} for row_id, user_id in expected])
+
+    calls = 0
+
+    def failing_destination(row):
+        nonlocal calls
+        calls += 1
+        if calls > 45:
+            raise RuntimeError('interrupted')
+        return even if row['user_id'] % 2 == 0 else odd
+
+    with pytest.raises(RuntimeError):
+        move_rows(source, rows_table, failing_destination, batch_size=10)
+    # A copy that landed before its source rows were deleted must not be duplicated
+    with source.connect() as connection:
+        leftover = connection.execute(select(rows_table).where(rows_table.c.id > 40, rows_table.c.id <= 50)).mappings().all()
+    with even.begin() as connection:
+        connection.execute(rows_table.insert(), [dict(row) for row in leftover if row['user_id'] % 2 == 0])
+
+    move_rows(source, rows_table, lambda row: even if row['user_id'] % 2 == 0 else odd, batch_size=10)
+    assert all_rows(source) == []
+    assert all_rows(even) == [row for row in expected if row[1] % 2 == 0]
+    assert all_rows(odd) == [row for row in expected if row[1] % 2 == 1]
+    with even.connect() as connection:
+        assert connection.execute(select(func.count()).select_from(rows_table)).scalar() == len(all_rows(even))
+
+
+# Run inside a fresh process: 'populate' writes users, logs and screenings,
+# 'write' adds one daily log per user, and every step prints each patient row
+# with the index of the database holding it (-1 for the main database)
+STEP = r'''
+import json, sys
+from app import app, db, create_tables, shard_router, DailyLog, EPDSScore
+step = sys.argv[1]
+client = app.test_client()
+with app.app_context():
+    create_tables()
+
+def token(name):
+    return {'Authorization': client.post('/login', json={'username': name, 'password': 'pw'}).json['token']}
+
+if step == 'populate':
+    for index in range(12):
+        client.post('/register', json={'username': f'u{index}', 'email': f'u{index}@x', 'password': 'pw'})
+        headers = token(f'u{index}')
+        for day in range(1, 4):
+            body = json.dumps({'type': 'daily_log', 'date': f'2026-01-0{day}', 'mental_health': 6, 'notes': 'crying'})
+            assert client.post('/sync', data=body, headers=headers, content_type='application/x-ndjson').status_code == 201
+        assert client.post('/epds', json={'score': index}, headers=headers).status_code == 201
+elif step == 'write':
+    for index in range(12):
+        assert client.post('/daily_log', json={'mental_health': 3}, headers=token(f'u{index}')).status_code == 201
+
+with app.app_context():
+    engines = [db.engine, *(shard_router.engines if shard_router else [])]
+    rows = {}
+    for model in (DailyLog, EPDSScore):
+        rows[model.__tablename__] = []
+        for index, engine in enumerate(engines, start=-1):
+            with engine.connect() as connection:
+                for row in connection.execute(db.select(model.id, model.user_id, model.date).order_by(model.id)):
+                    rows[model.__tablename__].append([index, row.id, row.user_id, str(row.date)])
+print(json.dumps(rows))
+'''
+
+
+def run(args, database, shards):
+    env = {**os.environ, 'DATABASE_URL': f'sqlite:///{database}', 'SHARD_COUNT': str(shards),
+           'SECRET_KEY': 'x' * 40, 'PASSWORD_HASH_ITERATIONS': '1', 'DATABASE_MODE': 'default'}
+    result = subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def step(name, database, shards):
+    return json.loads(run(['-c', STEP, name], database, shards).splitlines()[-1])
+
+
+def rebalance(database, shards):
+    return run(['-m', 'flask', '--app', 'app', 'rebalance-shards'], database, shards)
+
+
+# Rows without their location, in id order
+def contents(rows):
+    return {table: sorted(row[1:] for row in table_rows) for table, table_rows in rows.items()}
+
+
+def test_rebalance_keeps_every_row_and_id(tmp_path):
+    from sharding import shard_for
+    database = tmp_path / 'health.db'
+    before = step('populate', database, 0)
+    assert len(before['daily_log']) == 36 and len(before['epds_score']) == 12
+    assert all(row[0] == -1 for rows in before.values() for row in rows)
+
+    rebalance(database, 3)
+    sharded = step('read', database, 3)
+    assert contents(sharded) == contents(before)
+    assert all(row[0] == shard_for(row[2], 3) for rows in sharded.values() for row in rows)
+
+    # New rows on the shards get ids no other row has
+    written = step('write', database, 3)
+    ids = [row[1] for row in written['daily_log']]
+    assert len(ids) == len(set(ids)) == len(before['daily_log']) + 12
+
+    output = rebalance(database, 0)
+    assert 'is no longer used' in output
+    merged = step('read', database, 0)
+    assert contents(merged) == contents(written)
+    assert all(row[0] == -1 for rows in merged.values() for row in rows)
@@ -0,0 +1,38 @@
+# tests/test_token_cache.py
+# Cached tokens and their user snapshot never outlive a profile change: at once
+# in the process that made it, within TOKEN_REVALIDATE_SECONDS in any other.
+import pytest
+
+
+@pytest.fixture
+def patient(make_user):
+    return make_user(weeks_postpartum=4)
+
+
+def test_profile_update_invalidates_cached_tokens(app_module, client, patient):
+    _, headers = patient
+    assert client.get('/profile', headers=headers).get_json()['weeks_postpartum'] == 4
+    assert app_module.token_cache.get(headers['Authorization']) is not None
+    assert client.put('/profile', headers=headers, json={'weeks_postpartum': 5}).status_code == 200
+    assert app_module.token_cache.get(headers['Authorization']) is None
+    assert client.get('/profile', headers=headers).get_json()['weeks_postpartum'] == 5
+
+
+def test_revalidation_retires_a_stale_snapshot(app_module, client, patient, monkeypatch):
+    user_id, headers = patient
+    monkeypatch.setitem(app_module.app.config, 'TOKEN_REVALIDATE_SECONDS', 3600)
+    assert client.get('/profile', headers=headers).get_json()['weeks_postpartum'] == 4
+
+    # Another worker changes the profile; this process's token cache does not hear of it
+    with app_module.app.app_context():
+        connection = app_module.db.session.connection()
+        connection.execute(app_module.User.__table__.update().where(app_module.User.id == user_id)
+                           .values(weeks_postpartum=9))
+        app_module.bump_versions(connection, [user_id], ['profile'])
+        app_module.db.session.commit()
+    assert client.get('/profile', headers=headers).get_json()['weeks_postpartum'] == 4
+
+    monkeypatch.setitem(app_module.app.config, 'TOKEN_REVALIDATE_SECONDS', 0)
+    assert client.get('/profile', headers=headers).get_json()['weeks_postpartum'] == 9
+    monkeypatch.setitem(app_module.app.config, 'TOKEN_REVALIDATE_SECONDS', 3600)
+    assert client.get('/profile', headers=headers).get_json()['weeks_postpartum'] == 9
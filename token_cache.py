@@ -0,0 +1,66 @@
+# token_cache.py
+from collections import OrderedDict
+from threading import Lock
+import time
+
+
+# Bounded LRU cache of verified JWTs and a snapshot of the user they resolve to.
+# Entries expire at the token's own exp claim, and every token of a user can be
+# dropped at once when that user's profile changes. Each entry also records when
+# its snapshot was last confirmed current, so callers can recheck it periodically.
+class TokenCache:
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._tokens_by_user = {}
+        self._lock = Lock()
+
+    # (user data, time.monotonic() of its last check), or None
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            user_id, user_data, expires_at, checked_at = entry
+            if expires_at <= time.time():
+                self._remove(token)
+                return None
+            self._entries.move_to_end(token)
+            return user_data, checked_at
+
+    def put(self, token, user_id, user_data, expires_at):
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (user_id, user_data, expires_at, time.monotonic())
+            self._tokens_by_user.setdefault(user_id, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    # Record that a token's snapshot was just confirmed current
+    def mark_checked(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                self._entries[token] = (*entry[:3], time.monotonic())
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(token)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, token):
+        user_id = self._entries.pop(token)[0]
+        tokens = self._tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user_id]